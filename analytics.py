@@ -0,0 +1,69 @@
+# analytics.py — daily and per-slot booking aggregates, kept current by the writes that change them
+# reserve() and confirm() add to these rows inside their own transactions, so the admin dashboard
+# reads a bounded number of summary rows instead of scanning bookings. Days and slots are local to
+# the booked artist's location; a slot is a 30-minute slice of the clock (0 = midnight), so
+# artists with different hours share one grid.
+from datetime import datetime, time
+from slots import SLOT_MINUTES
+
+SLOTS_PER_CLOCK_DAY = 24 * 60 // SLOT_MINUTES
+
+
+def clock_slot_time(slot):
+    return time(slot * SLOT_MINUTES // 60, slot * SLOT_MINUTES % 60)
+
+
+def local_day(ts, studio_tz):
+    return str(datetime.fromtimestamp(ts, studio_tz).date())
+
+
+def slot_seconds(start_ts, end_ts, studio_tz):
+    # {(weekday, slot): seconds} covered by [start_ts, end_ts), walked one slot boundary at a time
+    covered = {}
+    ts = start_ts
+    while ts < end_ts:
+        local = datetime.fromtimestamp(ts, studio_tz)
+        step = min(SLOT_MINUTES * 60 - (local.minute % SLOT_MINUTES * 60 + local.second), end_ts - ts)
+        key = (local.weekday(), (local.hour * 60 + local.minute) // SLOT_MINUTES)
+        covered[key] = covered.get(key, 0) + step
+        ts += step
+    return covered
+
+
+def _add_daily(conn, day, holds=0, paid=0, paid_seconds=0, deposit_cents=0):
+    conn.execute(
+        "INSERT INTO daily_stats (day, holds, paid, paid_seconds, deposit_cents) VALUES (?, ?, ?, ?, ?) "
+        "ON CONFLICT (day) DO UPDATE SET holds = daily_stats.holds + excluded.holds, "
+        "paid = daily_stats.paid + excluded.paid, paid_seconds = daily_stats.paid_seconds + excluded.paid_seconds, "
+        "deposit_cents = daily_stats.deposit_cents + excluded.deposit_cents",
+        (day, holds, paid, paid_seconds, deposit_cents)
+    )
+
+
+def record_hold(conn, created_ts, studio_tz):
+    # Call inside the transaction that inserts the booking
+    _add_daily(conn, local_day(created_ts, studio_tz), holds=1)
+
+
+def record_paid(conn, confirmed_ts, start_ts, end_ts, deposit_cents, studio_tz):
+    # Call inside the transaction that confirms the booking
+    _add_daily(conn, local_day(confirmed_ts, studio_tz), paid=1, paid_seconds=end_ts - start_ts,
+               deposit_cents=deposit_cents)
+    conn.executemany(
+        "INSERT INTO slot_stats (weekday, slot, paid_seconds) VALUES (?, ?, ?) "
+        "ON CONFLICT (weekday, slot) DO UPDATE SET paid_seconds = slot_stats.paid_seconds + excluded.paid_seconds",
+        [(weekday, slot, seconds) for (weekday, slot), seconds in slot_seconds(start_ts, end_ts, studio_tz).items()]
+    )
+
+
+def daily(conn, first_day, last_day):
+    # Served by the daily_stats primary key; at most one row per day in the range
+    return conn.execute(
+        "SELECT day, holds, paid, paid_seconds, deposit_cents FROM daily_stats WHERE day >= ? AND day <= ? ORDER BY day",
+        (str(first_day), str(last_day))
+    ).fetchall()
+
+
+def by_slot(conn):
+    # At most 7 × SLOTS_PER_CLOCK_DAY rows
+    return conn.execute("SELECT weekday, slot, paid_seconds FROM slot_stats").fetchall()
@@ -0,0 +1,96 @@
+# assets.py — the page's stylesheet, font and images as built by build_assets.py into static/
+# Streamlit serves static/ at app/static/ (enableStaticServing in .streamlit/config.toml). Every URL carries
+# ?v=<content hash>, which makes Tornado's static handler answer with a ten-year Cache-Control, so browsers
+# fetch each asset once until a rebuild changes it. Anything missing from the manifest keeps its remote URL.
+import base64
+import json
+import os
+
+STATIC_DIR = "static"
+STATIC_URL = "app/static"
+MANIFEST_PATH = os.path.join(STATIC_DIR, "manifest.json")
+STYLESHEET_PATH = os.path.join(STATIC_DIR, "app.min.css")
+STYLES_SOURCE = "styles.css"
+
+# Streamlit's static handler labels only .jpg/.png/.gif/.webp with their image type; anything else goes out as
+# text/plain with nosniff, which browsers may refuse to decode. Set STATIC_IMAGE_TYPES=avif,webp where static/
+# is served with image/avif (e.g. behind a CDN) to offer the AVIF variants too.
+IMAGE_TYPES = [kind for kind in os.environ.get("STATIC_IMAGE_TYPES", "webp").split(",") if kind]
+
+FONT_FAMILY = "Dancing Script"
+LOGO_WIDTH = 360
+REMOTE_FONT_CSS = "https://fonts.googleapis.com/css2?family=Dancing+Script:wght@700&display=swap"
+REMOTE_BACKGROUND = "https://cdn.jsdelivr.net/gh/6Ace9/Cashin-Ink@main/background.png"
+REMOTE_LOGO = "https://raw.githubusercontent.com/6Ace9/Cashin-Ink/refs/heads/main/logo.PNG"
+
+
+def load_manifest(path=MANIFEST_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def url(manifest, filename):
+    return f"{STATIC_URL}/{filename}?v={manifest['versions'][filename]}"
+
+
+def _srcset(manifest, variants):
+    # variants: {width: filename}
+    return ", ".join(f"{url(manifest, name)} {width}w" for width, name in sorted(variants.items(), key=lambda v: int(v[0])))
+
+
+def font_rules(manifest):
+    # The subset is a few KB, so it rides inside the stylesheet: no request, and no MIME type to get wrong
+    font = manifest.get("font")
+    if not font:
+        return f"@import url('{REMOTE_FONT_CSS}');"
+    with open(os.path.join(STATIC_DIR, font), "rb") as f:
+        data = base64.b64encode(f.read()).decode()
+    return (f"@font-face{{font-family:'{FONT_FAMILY}';font-style:normal;font-weight:700;font-display:swap;"
+            f"src:url(data:font/woff2;base64,{data}) format('woff2')}}")
+
+
+def background_rules(manifest):
+    # Smallest variant by default, larger ones only for wider viewports; AVIF where the browser takes it
+    background = manifest.get("background")
+    if not background:
+        return f".stApp{{background-image:url('{REMOTE_BACKGROUND}')}}"
+    rules = []
+    widths = sorted(background["webp"], key=int)
+    for index, width in enumerate(widths):
+        candidates = [f"url('{url(manifest, background[kind][width])}') type('image/{kind}')"
+                      for kind in ("avif", "webp") if kind in IMAGE_TYPES and width in background.get(kind, {})]
+        rule = (f".stApp{{background-image:url('{url(manifest, background['webp'][width])}');"
+                f"background-image:image-set({','.join(candidates)})}}")
+        if index:
+            rule = f"@media (min-width:{int(widths[index - 1]) + 1}px){{{rule}}}"
+        rules.append(rule)
+    return "".join(rules)
+
+
+def asset_rules(manifest):
+    # @import has to come first in a stylesheet, so the font rule leads
+    return font_rules(manifest) + background_rules(manifest)
+
+
+def stylesheet(manifest):
+    # Asset rules for this manifest, then the minified styles.css (straight from the source when unbuilt)
+    path = STYLESHEET_PATH if os.path.exists(STYLESHEET_PATH) else STYLES_SOURCE
+    with open(path) as f:
+        return asset_rules(manifest) + f.read()
+
+
+def logo_html(manifest, css_class="logo-glow"):
+    logo = manifest.get("logo")
+    style = f"width:{LOGO_WIDTH}px;height:auto;"
+    if not logo:
+        return f'<img src="{REMOTE_LOGO}" class="{css_class}" style="{style}" alt="Cashin Ink">'
+    sources = "".join(
+        f'<source type="image/{kind}" srcset="{_srcset(manifest, logo[kind])}" sizes="{LOGO_WIDTH}px">'
+        for kind in ("avif", "webp") if kind in IMAGE_TYPES and logo.get(kind)
+    )
+    fallback = url(manifest, logo["webp"][str(LOGO_WIDTH)])
+    # Above the fold: fetched eagerly, with its box reserved so nothing shifts when it arrives
+    return (f'<picture>{sources}<img src="{fallback}" class="{css_class}" style="{style}" '
+            f'width="{LOGO_WIDTH}" height="{logo["height"]}" alt="Cashin Ink" fetchpriority="high"></picture>')
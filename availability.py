@@ -0,0 +1,68 @@
+# availability.py — booked-slot lookups for the "Check Availability" calendar
+import time
+from datetime import datetime, timedelta
+from db import parse_utc, to_epoch
+
+BOOKING_WINDOW_DAYS = 90
+# Upper bound on one appointment's length. Lets overlap checks seek on start_ts
+# from both sides instead of scanning every earlier booking.
+MAX_BOOKING_SECONDS = 24 * 3600
+
+
+def booking_window(studio_tz, now=None):
+    # Bookable range shown in the UI: tomorrow through tomorrow + 90 days (inclusive)
+    now = now or datetime.now(studio_tz)
+    first_day = now.date() + timedelta(days=1)
+    last_day = first_day + timedelta(days=BOOKING_WINDOW_DAYS)
+    return first_day, last_day
+
+
+def window_bounds(first_day, last_day, studio_tz):
+    start_local = studio_tz.localize(datetime.combine(first_day, datetime.min.time()))
+    end_local = studio_tz.localize(datetime.combine(last_day + timedelta(days=1), datetime.min.time()))
+    return to_epoch(start_local), to_epoch(end_local)
+
+
+def blocking_rows(conn, artist_id, columns, start_ts, end_ts, now=None, limit=None):
+    # One artist's paid bookings and unexpired holds overlapping [start_ts, end_ts) both block a slot.
+    # Each branch is served by idx_bookings_artist_span: equality on artist_id and deposit_paid,
+    # bounded range on start_ts, so other artists' rows are never read.
+    span = (artist_id, start_ts - MAX_BOOKING_SECONDS, end_ts, start_ts)
+    sql = (
+        f"SELECT {columns} FROM bookings "
+        "WHERE artist_id = ? AND deposit_paid = 1 AND start_ts > ? AND start_ts < ? AND end_ts > ? "
+        "UNION ALL "
+        f"SELECT {columns} FROM bookings "
+        "WHERE artist_id = ? AND deposit_paid = 0 AND start_ts > ? AND start_ts < ? AND end_ts > ? "
+        "AND hold_expires_ts > ?"
+    )
+    if limit:
+        sql += f" LIMIT {int(limit)}"
+    return conn.execute(sql, span + span + (int(now or time.time()),)).fetchall()
+
+
+def find_conflict(conn, artist_id, start_ts, end_ts, now=None):
+    rows = blocking_rows(conn, artist_id, "name", start_ts, end_ts, now, limit=1)
+    return rows[0] if rows else None
+
+
+def booked_events(conn, schedule, first_day, last_day):
+    studio_tz = schedule.tz
+    window_start, window_end = window_bounds(first_day, last_day, studio_tz)
+    rows = conn.execute(
+        "SELECT name, start_dt, end_dt FROM bookings "
+        "WHERE artist_id = ? AND deposit_paid = 1 AND start_ts > ? AND start_ts < ? AND end_ts > ?",
+        (schedule.artist_id, window_start - MAX_BOOKING_SECONDS, window_end, window_start)
+    ).fetchall()
+
+    events = []
+    for name, start_utc, end_utc in rows:
+        events.append({
+            "title": f"Booked – {name}",
+            "start": parse_utc(start_utc).astimezone(studio_tz).isoformat(),
+            "end": parse_utc(end_utc).astimezone(studio_tz).isoformat(),
+            "backgroundColor": "#ff4444",
+            "borderColor": "#ff4444",
+            "textColor": "white"
+        })
+    return events
@@ -0,0 +1,94 @@
+# bench_conflict.py — conflict-check latency vs. table size
+#   python benchmarks/bench_conflict.py [--sizes 10000 100000 1000000] [--probes 2000] [--artists 1]
+#                                       [--database-url postgresql://...]
+# With --artists N the rows are spread over N chairs working the same hours; probes check the first one.
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import pytz
+import db
+import availability
+import schedules
+from backends import add_argument, scratch_database
+
+LEGACY_QUERY = "SELECT name FROM bookings WHERE deposit_paid = 1 AND start_dt < ? AND end_dt > ?"
+EPOCH_0 = datetime(2020, 1, 1, tzinfo=pytz.UTC)
+
+
+def artist_id(i):
+    return schedules.DEFAULT_ARTIST_ID if i == 0 else f"chair{i}"
+
+
+def seed(conn, rows, artists):
+    # For each artist, one booking every ~3 hours going forward from 2020, 75% of them paid
+    for i in range(1, artists):
+        conn.execute("INSERT INTO artists (id, name, location_id) VALUES (?, ?, ?)",
+                     (artist_id(i), f"Chair {i}", schedules.DEFAULT_LOCATION_ID))
+    insert = ("INSERT INTO bookings (id, artist_id, name, start_dt, end_dt, start_ts, end_ts, deposit_paid) "
+              "VALUES (?,?,?,?,?,?,?,?)")
+    batch = []
+    for i in range(rows):
+        start = EPOCH_0 + timedelta(hours=3 * (i // artists))
+        end = start + timedelta(hours=random.choice([1, 2]))
+        batch.append((
+            f"b{i}", artist_id(i % artists), f"Customer {i}", start.isoformat(), end.isoformat(),
+            db.to_epoch(start), db.to_epoch(end), int(random.random() < 0.75)
+        ))
+        if len(batch) == 10000:
+            conn.executemany(insert, batch)
+            batch = []
+    if batch:
+        conn.executemany(insert, batch)
+    conn.commit()
+    conn.execute("ANALYZE")
+
+
+def probe_spans(rows, probes):
+    spans = []
+    for _ in range(probes):
+        start = EPOCH_0 + timedelta(hours=3 * random.randrange(rows), minutes=random.choice([0, 30, 90]))
+        spans.append((start, start + timedelta(hours=2)))
+    return spans
+
+
+def timed(fn, spans):
+    samples = []
+    for start, end in spans:
+        t = time.perf_counter()
+        fn(start, end)
+        samples.append((time.perf_counter() - t) * 1e6)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.99) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--probes", type=int, default=2000)
+    parser.add_argument("--artists", type=int, default=1)
+    add_argument(parser)
+    args = parser.parse_args()
+
+    print(f"{'rows':>10}  {'indexed p50':>12}  {'indexed p99':>12}  {'legacy p50':>12}  {'legacy p99':>12}")
+    for rows in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp, scratch_database(tmp, args.database_url) as path:
+            conn = db.connect(path)
+            seed(conn, rows, args.artists)
+            spans = probe_spans(rows // args.artists, args.probes)
+
+            indexed = timed(lambda s, e: availability.find_conflict(conn, schedules.DEFAULT_ARTIST_ID, db.to_epoch(s), db.to_epoch(e)), spans)
+            legacy = timed(lambda s, e: conn.execute(LEGACY_QUERY, (e.isoformat(), s.isoformat())).fetchone(),
+                           spans[: max(20, args.probes // 20)])
+            conn.close()
+        print(f"{rows:>10}  {indexed[0]:>10.1f}µs  {indexed[1]:>10.1f}µs  {legacy[0]:>10.1f}µs  {legacy[1]:>10.1f}µs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,383 @@
+# bench_e2e.py — simulated customers through reserve → Checkout → webhook → confirmation email / calendar sync
+#   pip install -r requirements-bench.txt
+#   python benchmarks/bench_e2e.py [--rows 0 10000 100000] [--concurrency 1 8 32] [--attempts 200] [--out results.json]
+#   python benchmarks/bench_e2e.py --stripe-mock http://localhost:12111 --caldav http://host:5232   (external stand-ins)
+#   python benchmarks/bench_e2e.py --compare baseline.json   (exit 1 when a p95 regresses past --tolerance)
+#   python benchmarks/bench_e2e.py --database-url postgresql://...   (Postgres backend, see backends.py)
+# Stand-ins, all local: Stripe is stripe-mock when --stripe-mock is given, otherwise a minimal in-process fake of the
+# Checkout Sessions endpoints; email goes to an aiosmtpd sink; CalDAV is a Radicale server unless --caldav is given.
+# The webhook runs under gunicorn exactly as in production (dispatcher + calendar worker per gunicorn worker).
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import requests
+from aiosmtpd.controller import Controller
+from flask import Flask, jsonify, request
+from werkzeug.serving import make_server
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import caldav
+import pytz
+import stripe
+import checkout
+import db
+import outbox
+import reservations
+import schedules
+from backends import add_argument, scratch_database
+from bench_webhook import signed, wait_for_server
+
+STUDIO_TZ = pytz.timezone("America/Los_Angeles")
+SECRET = "whsec_bench"
+PHASES = ("reserve", "checkout", "webhook_ack", "confirm_wait", "end_to_end")
+# Only bookings made during the run can collide; the seeded history lies entirely in the past
+DOUBLE_BOOKINGS = """
+    SELECT COUNT(*) FROM bookings a JOIN bookings b
+    ON a.id < b.id AND a.start_ts < b.end_ts AND b.start_ts < a.end_ts
+    WHERE a.deposit_paid = 1 AND b.deposit_paid = 1 AND a.start_ts >= ? AND b.start_ts >= ?
+"""
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+# ==================== STAND-INS ====================
+def fake_stripe(latency, sessions=None):
+    # Just enough of the Checkout Sessions API for checkout.py and reconcile.py, including idempotent replays.
+    # Pass `sessions` to seed or inspect them.
+    app = Flask("fake-stripe")
+    sessions = {} if sessions is None else sessions
+    by_key, lock = {}, threading.Lock()
+
+    @app.route("/v1/checkout/sessions", methods=["POST"])
+    def create():
+        time.sleep(latency)
+        key = request.headers.get("Idempotency-Key")
+        with lock:
+            if key in by_key:
+                return jsonify(sessions[by_key[key]])
+            sid = f"cs_test_{uuid.uuid4().hex}"
+            sessions[sid] = {"id": sid, "object": "checkout.session", "status": "open", "payment_status": "unpaid",
+                             "created": int(time.time()), "url": f"https://checkout.stripe.test/pay/{sid}",
+                             "metadata": {"booking_id": request.form.get("metadata[booking_id]")}}
+            by_key[key] = sid
+        return jsonify(sessions[sid])
+
+    @app.route("/v1/checkout/sessions", methods=["GET"])
+    def list_sessions():
+        # Newest first, cursor-paged with starting_after, filtered on created[gte] and status
+        time.sleep(latency)
+        limit = int(request.args.get("limit", 10))
+        since = int(request.args.get("created[gte]", 0))
+        status = request.args.get("status")
+        with lock:
+            found = sorted((s for s in sessions.values() if s["created"] >= since and status in (None, s["status"])),
+                           key=lambda s: (s["created"], s["id"]), reverse=True)
+        after = request.args.get("starting_after")
+        if after:
+            found = found[[s["id"] for s in found].index(after) + 1:]
+        return jsonify({"object": "list", "url": "/v1/checkout/sessions", "data": found[:limit],
+                        "has_more": len(found) > limit})
+
+    @app.route("/v1/checkout/sessions/<sid>", methods=["GET"])
+    def retrieve(sid):
+        time.sleep(latency)
+        return jsonify(sessions[sid])
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    port = free_port()
+    server = make_server("127.0.0.1", port, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{port}", server.shutdown
+
+
+class SinkHandler:
+    def __init__(self):
+        self.received = 0
+
+    async def handle_DATA(self, server, session, envelope):
+        self.received += 1
+        return "250 OK"
+
+
+def radicale(folder):
+    port = free_port()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "radicale", "--server-hosts", f"127.0.0.1:{port}", "--auth-type", "none",
+         "--storage-filesystem-folder", folder],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    return f"http://127.0.0.1:{port}", proc
+
+
+def ensure_calendar(url):
+    principal = caldav.DAVClient(url=url, username="bench", password="bench").principal()
+    if not principal.calendars():
+        principal.make_calendar(name="bench")
+
+
+# ==================== ONE RUN ====================
+def seed_history(path, rows):
+    # Past bookings, ending before today, so table size grows without blocking any slot the customers want
+    conn = db.connect(path)
+    end = datetime.now(pytz.UTC).replace(minute=0, second=0, microsecond=0) - timedelta(days=1)
+    batch = []
+    for i in range(rows):
+        start = end - timedelta(hours=3 * (i + 1))
+        stop = start + timedelta(hours=random.choice([1, 2]))
+        batch.append((f"h{i}", schedules.DEFAULT_ARTIST_ID, f"History {i}", start.isoformat(), stop.isoformat(),
+                      db.to_epoch(start), db.to_epoch(stop), int(random.random() < 0.75)))
+        if len(batch) == 10000 or i == rows - 1:
+            with db.transaction(conn):
+                conn.executemany("INSERT INTO bookings (id, artist_id, name, start_dt, end_dt, start_ts, end_ts, "
+                                 "deposit_paid) VALUES (?,?,?,?,?,?,?,?)", batch)
+            batch = []
+    conn.execute("ANALYZE")
+    conn.close()
+
+
+def customer(path, webhook_url, days, samples, counts, lock):
+    conn = db.get_conn(path)
+    http = requests.Session()
+    day = datetime.now(STUDIO_TZ).date() + timedelta(days=random.randint(1, days))
+    start = STUDIO_TZ.localize(datetime.combine(day, datetime.min.time()) + timedelta(hours=random.randint(12, 18)))
+    end = start + timedelta(hours=random.choice([1, 2]))
+    bid, email = str(uuid.uuid4()), f"{uuid.uuid4().hex[:8]}@example.com"
+    timings = {}
+
+    t0 = time.perf_counter()
+    try:
+        reservations.reserve(conn, bid, "Bench", 30, "555", email, "bench", str(day), "", start, end)
+    except reservations.SlotTaken:
+        with lock:
+            counts["rejected"] += 1
+        return
+    t1 = time.perf_counter()
+    session = checkout.session_for_booking(conn, bid, "Bench", email, "https://x.test/ok", "https://x.test/")
+    t2 = time.perf_counter()
+    body, headers = signed({
+        "id": f"evt_{uuid.uuid4().hex}", "object": "event", "type": "checkout.session.completed",
+        "data": {"object": {"object": "checkout.session", "id": session.id, "metadata": {"booking_id": bid}}}
+    }, SECRET)
+    http.post(webhook_url, data=body, headers=headers, timeout=10).raise_for_status()
+    t3 = time.perf_counter()
+    # Paid once the webhook service's dispatcher has applied the event
+    deadline = t3 + 30
+    while not conn.execute("SELECT deposit_paid FROM bookings WHERE id = ?", (bid,)).fetchone()[0]:
+        if time.perf_counter() > deadline:
+            with lock:
+                counts["unconfirmed"] += 1
+            return
+        time.sleep(0.01)
+    t4 = time.perf_counter()
+
+    timings.update(reserve=t1 - t0, checkout=t2 - t1, webhook_ack=t3 - t2, confirm_wait=t4 - t3, end_to_end=t4 - t0)
+    with lock:
+        counts["confirmed"] += 1
+        for phase, seconds in timings.items():
+            samples[phase].append(seconds * 1000)
+
+
+def percentiles(values):
+    if not values:
+        return None
+    values = sorted(values)
+    pick = lambda q: values[min(len(values) - 1, int(len(values) * q))]
+    return {"p50": round(statistics.median(values), 2), "p95": round(pick(0.95), 2),
+            "p99": round(pick(0.99), 2), "max": round(values[-1], 2)}
+
+
+def drain(conn, smtp, timeout=120):
+    # Sends queued email from this process and waits for the webhook service to finish calendar writes
+    limiter = outbox.RateLimiter(per_minute=60_000)  # the sink has no iCloud quota
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        outbox.process_due(conn, smtp, limiter, batch_size=100)
+        pending = conn.execute(
+            "SELECT (SELECT COUNT(*) FROM outbox WHERE status = 'pending') + "
+            "(SELECT COUNT(*) FROM calendar_jobs WHERE status = 'pending') + "
+            "(SELECT COUNT(*) FROM stripe_events WHERE status = 'pending')"
+        ).fetchone()[0]
+        if not pending:
+            return True
+        time.sleep(0.1)
+    return False
+
+
+def run(args, rows, concurrency, caldav_url, smtp_port):
+    with tempfile.TemporaryDirectory() as tmp, scratch_database(tmp, args.database_url, db.DB_PATH) as path:
+        seed_history(path, rows)
+        window_start = int(time.time())
+
+        port = free_port()
+        env = dict(os.environ, STRIPE_SECRET_KEY="sk_test_bench", STRIPE_WEBHOOK_SECRET=SECRET,
+                   ICLOUD_USER="bench", ICLOUD_PASS="bench", CALDAV_URL=caldav_url, DATABASE_URL=path,
+                   PORT=str(port), WEB_CONCURRENCY=str(args.workers), PYTHONPATH=ROOT)
+        server = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "-c", os.path.join(ROOT, "gunicorn.conf.py"),
+             "--access-logfile", "/dev/null", "webhook:app"],
+            cwd=tmp, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            webhook_url = f"http://127.0.0.1:{port}/webhook"
+            wait_for_server(webhook_url)
+            samples = {phase: [] for phase in PHASES}
+            counts = {"confirmed": 0, "rejected": 0, "unconfirmed": 0}
+            lock = threading.Lock()
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(concurrency) as pool:
+                for future in [pool.submit(customer, path, webhook_url, args.days, samples, counts, lock)
+                               for _ in range(args.attempts)]:
+                    future.result()
+            elapsed = time.perf_counter() - started
+
+            conn = db.get_conn(path)
+            smtp = outbox.SMTPConnection("bench@example.com", "", "127.0.0.1", smtp_port, starttls=False)
+            drained = drain(conn, smtp)
+            drain_seconds = time.perf_counter() - started - elapsed
+            smtp.close()
+
+            result = {
+                "rows": rows, "concurrency": concurrency, "attempts": args.attempts,
+                "elapsed_s": round(elapsed, 3),
+                "attempts_per_s": round(args.attempts / elapsed, 1),
+                "confirmed_per_s": round(counts["confirmed"] / elapsed, 1),
+                **counts,
+                "double_bookings": conn.execute(DOUBLE_BOOKINGS, (window_start, window_start)).fetchone()[0],
+                "emails_sent": conn.execute("SELECT COUNT(*) FROM outbox WHERE status = 'sent'").fetchone()[0],
+                "calendar_synced": conn.execute("SELECT COUNT(*) FROM calendar_jobs WHERE status = 'done'").fetchone()[0],
+                "drained": drained, "drain_s": round(drain_seconds, 3),
+                "latency_ms": {phase: percentiles(samples[phase]) for phase in PHASES},
+            }
+            conn.close()
+            return result
+        finally:
+            server.terminate()
+            server.wait()
+
+
+# ==================== REPORTING ====================
+def compare(baseline, runs, tolerance):
+    # p95 per phase, matched on (rows, concurrency)
+    previous = {(r["rows"], r["concurrency"]): r for r in baseline["runs"]}
+    regressions = 0
+    for run_ in runs:
+        before = previous.get((run_["rows"], run_["concurrency"]))
+        if not before:
+            continue
+        for phase in PHASES:
+            old, new = (before["latency_ms"].get(phase) or {}).get("p95"), (run_["latency_ms"][phase] or {}).get("p95")
+            if not old or not new:
+                continue
+            change = (new - old) / old * 100
+            flag = "REGRESSION" if change > tolerance else ""
+            regressions += bool(flag)
+            print(f"rows={run_['rows']:<8} c={run_['concurrency']:<3} {phase:<13} p95 {old:>8.1f} → {new:>8.1f}ms "
+                  f"({change:+.0f}%) {flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, nargs="+", default=[0, 10_000, 100_000], help="seeded history sizes")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--attempts", type=int, default=200, help="customers per run")
+    parser.add_argument("--days", type=int, default=14, help="spread of requested dates; smaller means more contention")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn workers for webhook.py")
+    parser.add_argument("--stripe-mock", help="stripe-mock base URL; default is the in-process fake")
+    parser.add_argument("--stripe-latency", type=float, default=0.05, help="seconds added per fake Stripe call")
+    parser.add_argument("--caldav", help="CalDAV server URL; default starts Radicale")
+    parser.add_argument("--out", help="write results as JSON")
+    parser.add_argument("--compare", help="earlier --out file to check p95s against")
+    parser.add_argument("--tolerance", type=float, default=20, help="allowed p95 increase in percent")
+    add_argument(parser)
+    args = parser.parse_args()
+
+    cleanup = []
+    try:
+        checkout.configure("sk_test_bench")
+        checkout.BACKOFF_BASE_SECONDS = 0.05
+        if args.stripe_mock:
+            stripe.api_base = args.stripe_mock
+        else:
+            stripe.api_base, stop = fake_stripe(args.stripe_latency)
+            cleanup.append(stop)
+
+        sink = SinkHandler()
+        smtp_port = free_port()
+        controller = Controller(sink, hostname="127.0.0.1", port=smtp_port)
+        controller.start()
+        cleanup.append(controller.stop)
+
+        caldav_url = args.caldav
+        if not caldav_url:
+            folder = tempfile.mkdtemp()
+            caldav_url, proc = radicale(folder)
+            cleanup.append(lambda: (proc.terminate(), proc.wait(), shutil.rmtree(folder, ignore_errors=True)))
+            deadline = time.time() + 20
+            while True:
+                try:
+                    requests.get(caldav_url, timeout=1)
+                    break
+                except requests.ConnectionError:
+                    if time.time() > deadline:
+                        raise
+                    time.sleep(0.2)
+        ensure_calendar(caldav_url)
+
+        runs = []
+        print(f"{'rows':>8} {'conc':>4} {'att/s':>7} {'conf/s':>7} {'ok':>5} {'taken':>5} {'lost':>4} {'dbl':>4} "
+              f"{'e2e p50':>9} {'e2e p95':>9} {'e2e p99':>9} {'drain':>7}")
+        for rows in args.rows:
+            for concurrency in args.concurrency:
+                r = run(args, rows, concurrency, caldav_url, smtp_port)
+                runs.append(r)
+                e2e = r["latency_ms"]["end_to_end"] or {"p50": 0, "p95": 0, "p99": 0}
+                print(f"{rows:>8} {concurrency:>4} {r['attempts_per_s']:>7} {r['confirmed_per_s']:>7} "
+                      f"{r['confirmed']:>5} {r['rejected']:>5} {r['unconfirmed']:>4} {r['double_bookings']:>4} "
+                      f"{e2e['p50']:>7.1f}ms {e2e['p95']:>7.1f}ms {e2e['p99']:>7.1f}ms {r['drain_s']:>6.1f}s")
+        print(f"emails received by sink: {sink.received}")
+
+        git_rev = subprocess.run(["git", "-C", ROOT, "rev-parse", "--short", "HEAD"],
+                                 capture_output=True, text=True).stdout.strip()
+        report = {
+            "meta": {"git_rev": git_rev, "backend": "postgres" if args.database_url else "sqlite", "started": datetime.utcnow().isoformat(), "python": platform.python_version(),
+                     "stripe": args.stripe_mock or f"fake (+{args.stripe_latency}s)", "caldav": caldav_url,
+                     "attempts": args.attempts, "days": args.days, "workers": args.workers},
+            "runs": runs,
+        }
+        if args.out:
+            with open(args.out, "w") as f:
+                json.dump(report, f, indent=2)
+        failed = any(r["double_bookings"] for r in runs)
+        if args.compare:
+            with open(args.compare) as f:
+                failed |= bool(compare(json.load(f), runs, args.tolerance))
+        sys.exit(1 if failed else 0)
+    finally:
+        for stop in reversed(cleanup):
+            stop()
+
+
+if __name__ == "__main__":
+    main()
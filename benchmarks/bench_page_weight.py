@@ -0,0 +1,122 @@
+# bench_page_weight.py — page weight and estimated first paint of the page head, before vs. after self-hosting
+#   python benchmarks/bench_page_weight.py [--before-ref REV] [--rtt-ms 150] [--mbps 5]
+# "before" is the inline <style>/logo markup of app.py at --before-ref (default: the last revision that had it,
+# before self-hosting); "after" is what assets.py renders from the current static/. Remote sizes are fetched
+# when reachable (otherwise n/a, or the file at --before-ref).
+# First paint is modelled, not measured in a browser: a stylesheet @import blocks rendering until it arrives, and
+# each new third-party origin costs DNS + TCP + TLS (3 RTT) before its first request (1 RTT) and transfer.
+import argparse
+import os
+import re
+import subprocess
+import sys
+from urllib.parse import urlparse
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import assets
+
+URL_PATTERN = re.compile(r"""(https://[^\s'")]+|app/static/[^\s'")?]+)""")
+IMPORT_PATTERN = re.compile(r"""@import url\(['"]?(https://[^'")]+)""")
+SETUP_RTTS = 3
+INLINE_HEAD = re.compile(r'st\.markdown\("""(\s*<style>.*?)""", unsafe_allow_html=True\)', re.S)
+
+
+def inline_head(ref):
+    source = subprocess.check_output(["git", "-C", ROOT, "show", f"{ref}:app.py"], text=True)
+    match = INLINE_HEAD.search(source)
+    return match.group(1) if match else None
+
+
+def last_inline_ref():
+    # Newest revision of app.py that still wrote the page head inline, i.e. the one before self-hosting
+    revisions = subprocess.check_output(["git", "-C", ROOT, "rev-list", "HEAD", "--", "app.py"], text=True).split()
+    for ref in revisions:
+        if inline_head(ref) is not None:
+            return ref[:7]
+    sys.exit("No revision of app.py with an inline page head; pass --before-ref")
+
+
+def after_head():
+    os.chdir(ROOT)
+    manifest = assets.load_manifest()
+    return f"<style>{assets.stylesheet(manifest)}</style>{assets.logo_html(manifest)}"
+
+
+def resource_size(url, ref):
+    if url.startswith("app/static/"):
+        return os.path.getsize(os.path.join(ROOT, assets.STATIC_DIR, url[len("app/static/"):]))
+    try:
+        response = requests.get(url, timeout=10, headers={"User-Agent": "Mozilla/5.0 Chrome/126"})
+        response.raise_for_status()
+        return len(response.content)
+    except requests.RequestException:
+        pass
+    # The repo's own files as of --before-ref stand in for their raw.githubusercontent / jsDelivr URLs
+    name = os.path.basename(urlparse(url).path)
+    try:
+        return len(subprocess.check_output(["git", "-C", ROOT, "show", f"{ref}:{name}"], stderr=subprocess.DEVNULL))
+    except subprocess.CalledProcessError:
+        return None
+
+
+def transfer_ms(size, args):
+    return (size or 0) * 8 / (args.mbps * 1e6) * 1000
+
+
+def fetch_ms(url, size, args):
+    # Same-origin assets reuse the page's connection
+    rtts = 1 if url.startswith("app/static/") else SETUP_RTTS + 1
+    return rtts * args.rtt_ms + transfer_ms(size, args)
+
+
+def report(label, head, args):
+    # One variant per asset, as a 1x screen at the narrowest breakpoint fetches: the logo <img> src and the
+    # first (default) background rule
+    logo = URL_PATTERN.findall(re.search(r'<img src="([^"]+)"', head).group(1))
+    fetched = {}
+    for u in URL_PATTERN.findall(head):
+        fetched.setdefault(re.sub(r"-\d+\.\w+$", "", u), u)
+    fetched = [u for u in fetched.values() if "logo" not in u] + logo
+    sizes = {u: resource_size(u, args.before_ref) for u in fetched}
+    blocking = IMPORT_PATTERN.findall(head)
+    origins = {urlparse(u).netloc for u in fetched if u.startswith("https://")}
+
+    print(f"\n{label}")
+    print(f"  {'inline head (sent each full rerun)':<60} {len(head.encode()):>9} B")
+    for u in fetched:
+        size = sizes[u]
+        print(f"  {u[:60]:<60} {size if size is not None else 'n/a':>9}{' B' if size is not None else ''}")
+    known = sum(s for s in sizes.values() if s is not None)
+    missing = sum(1 for s in sizes.values() if s is None)
+    print(f"  {'total':<60} {known + len(head.encode()):>9} B" + (f"  (+{missing} n/a)" if missing else ""))
+    print(f"  third-party origins: {len(origins)}  render-blocking requests: {len(blocking)}")
+
+    first_paint = max((fetch_ms(u, sizes.get(u), args) for u in blocking), default=0)
+    logo_ms = fetch_ms(logo[-1], sizes.get(logo[-1]), args) if logo else 0
+    print(f"  est. first paint after the app shell: {first_paint:>7.0f} ms")
+    print(f"  est. logo visible after the app shell: {max(first_paint, logo_ms):>6.0f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--before-ref", help="revision whose inline app.py head is the baseline")
+    parser.add_argument("--rtt-ms", type=float, default=150)
+    parser.add_argument("--mbps", type=float, default=5)
+    args = parser.parse_args()
+
+    args.before_ref = args.before_ref or last_inline_ref()
+    before = inline_head(args.before_ref)
+    if before is None:
+        sys.exit(f"app.py at {args.before_ref} has no inline page head (it already uses assets.py); "
+                 "pass an earlier --before-ref")
+
+    print(f"model: rtt={args.rtt_ms:.0f}ms bandwidth={args.mbps}Mbps, {SETUP_RTTS} RTT per new origin")
+    report(f"before ({args.before_ref})", before, args)
+    report("after (static/)", after_head(), args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+# bench_reconcile.py — reconcile.py over thousands of payments the app never recorded: API calls, time, correctness
+#   python benchmarks/bench_reconcile.py [--pending 5000] [--paid-fraction 0.8] [--latency 0.05] [--database-url ...]
+#   python benchmarks/bench_reconcile.py --stripe-mock http://localhost:12111   (request shapes against stripe-mock)
+# Against the in-process fake (bench_e2e.py's, with list paging) every pending booking has a session; the paid
+# ones are what a missed success page and webhook leave behind. The per-row alternative, one Session.retrieve per
+# pending booking, is timed over a sample and extrapolated.
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import pytz
+import stripe
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import checkout
+import db
+import reconcile
+import schedules
+from backends import add_argument, scratch_database
+from bench_e2e import fake_stripe
+
+RETRIEVE_SAMPLE = 100
+
+
+def seed(conn, sessions, pending, paid_fraction):
+    # One-hour unpaid bookings back to back from tomorrow, created over the last day, each with its session
+    now = int(time.time())
+    first = datetime.now(pytz.UTC).replace(minute=0, second=0, microsecond=0) + timedelta(days=1)
+    rows, paid = [], set()
+    for i in range(pending):
+        start = first + timedelta(hours=i)
+        created = now - random.randrange(24 * 3600)
+        bid, sid = str(uuid.uuid4()), f"cs_test_{uuid.uuid4().hex}"
+        is_paid = random.random() < paid_fraction
+        sessions[sid] = {"id": sid, "object": "checkout.session", "created": created,
+                         "status": "complete" if is_paid else "open", "payment_status": "paid" if is_paid else "unpaid",
+                         "metadata": {"booking_id": bid}}
+        if is_paid:
+            paid.add(bid)
+        rows.append((bid, schedules.DEFAULT_ARTIST_ID, f"Pending {i}", start.isoformat(),
+                     (start + timedelta(hours=1)).isoformat(), db.to_epoch(start), db.to_epoch(start) + 3600,
+                     now + 3600, sid, datetime.utcfromtimestamp(created).isoformat()))
+    # Sessions from other days and abandoned checkouts share the account
+    for _ in range(pending // 2):
+        sid = f"cs_test_{uuid.uuid4().hex}"
+        sessions[sid] = {"id": sid, "object": "checkout.session", "created": now - random.randrange(7 * 86400),
+                         "status": "expired", "payment_status": "unpaid", "metadata": {}}
+    with db.transaction(conn):
+        conn.executemany(
+            "INSERT INTO bookings (id, artist_id, name, start_dt, end_dt, start_ts, end_ts, deposit_paid, "
+            "hold_expires_ts, stripe_session_id, created_at) VALUES (?,?,?,?,?,?,?,0,?,?,?)", rows
+        )
+    return paid
+
+
+def per_row_seconds(conn, sample):
+    ids = [row[0] for row in conn.execute(
+        "SELECT stripe_session_id FROM bookings WHERE stripe_session_id IS NOT NULL LIMIT ?", (sample,)
+    )]
+    started = time.perf_counter()
+    for sid in ids:
+        checkout.with_retries(lambda: stripe.checkout.Session.retrieve(sid))
+    return (time.perf_counter() - started) / max(len(ids), 1)
+
+
+def run_fake(args):
+    sessions = {}
+    stripe.api_base, stop = fake_stripe(args.latency, sessions)
+    try:
+        with tempfile.TemporaryDirectory() as tmp, scratch_database(tmp, args.database_url) as path:
+            conn = db.connect(path)
+            paid = seed(conn, sessions, args.pending, args.paid_fraction)
+
+            started = time.perf_counter()
+            stats = reconcile.reconcile(conn)
+            elapsed = time.perf_counter() - started
+            confirmed = {row[0] for row in conn.execute("SELECT id FROM bookings WHERE deposit_paid = 1")}
+            jobs = conn.execute("SELECT COUNT(*) FROM calendar_jobs").fetchone()[0]
+            again = reconcile.reconcile(conn)
+            per_row = per_row_seconds(conn, RETRIEVE_SAMPLE)
+            conn.close()
+    finally:
+        stop()
+
+    print(f"pending={args.pending} paid_on_stripe={len(paid)} sessions_on_account={len(sessions)} "
+          f"latency={args.latency * 1000:.0f}ms")
+    print(f"reconcile: {stats['api_calls']} API calls, {elapsed:.2f}s, confirmed={stats['confirmed']} "
+          f"conflicts={len(stats['conflicts'])} missing={len(stats['missing'])}")
+    print(f"per-row retrieve: {args.pending} API calls, ~{per_row * args.pending:.1f}s (extrapolated)")
+    print(f"confirmed == paid: {confirmed == paid}  calendar jobs queued: {jobs}  second run confirmed: "
+          f"{again['confirmed']}")
+    if confirmed != paid or jobs != len(paid) or again["confirmed"]:
+        sys.exit(1)
+
+
+def run_stripe_mock(args):
+    # stripe-mock serves fixtures, not state: this checks that the list call and its paging parameters
+    # validate against Stripe's OpenAPI spec and that the response parses
+    stripe.api_base = args.stripe_mock
+    paid, calls = reconcile.paid_sessions(int(time.time()) - 3600)
+    print(f"stripe-mock: list accepted, {calls} call(s), {len(paid)} paid session(s) in the fixture")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pending", type=int, default=5000)
+    parser.add_argument("--paid-fraction", type=float, default=0.8)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds added per fake Stripe call")
+    parser.add_argument("--stripe-mock", help="stripe-mock base URL")
+    add_argument(parser)
+    args = parser.parse_args()
+
+    checkout.configure("sk_test_bench")
+    if args.stripe_mock:
+        run_stripe_mock(args)
+    else:
+        run_fake(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+# bench_rerun.py — cost of a widget-triggered rerun: whole script vs. the calendar / booking fragments
+#   python benchmarks/bench_rerun.py [--bookings 500] [--runs 20] [--before-ref HEAD~1]
+# Drives app.py through Streamlit's in-process script runner (no browser, no server) against a seeded copy
+# of the database. --before-ref also times full reruns of app.py as of that git revision.
+import argparse
+import logging
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import pytz
+import streamlit as st
+from streamlit.runtime import Runtime
+from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+from streamlit.runtime.media_file_manager import MediaFileManager
+from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+from streamlit.runtime.pages_manager import PagesManager
+from streamlit.runtime.scriptrunner import RerunData
+from streamlit.runtime.secrets import Secrets
+from streamlit.runtime.state.safe_session_state import SafeSessionState
+from streamlit.runtime.state.session_state import SessionState
+from streamlit.testing.v1.local_script_runner import LocalScriptRunner
+import assets
+import availability
+import db
+import schedules
+
+STUDIO_TZ = pytz.timezone("America/Los_Angeles")
+
+
+def seed(path, bookings):
+    # Paid 1–3 hour bookings spread over the booking window, as the calendar would show them
+    conn = db.connect(path)
+    first_day, last_day = availability.booking_window(STUDIO_TZ)
+    days = (last_day - first_day).days + 1
+    rows = []
+    for i in range(bookings):
+        day = first_day + timedelta(days=random.randrange(days))
+        start = STUDIO_TZ.localize(datetime.combine(day, datetime.min.time()) + timedelta(hours=random.randrange(12, 18)))
+        end = start + timedelta(hours=random.choice([1, 2, 3]))
+        start_utc, end_utc = start.astimezone(pytz.UTC), end.astimezone(pytz.UTC)
+        rows.append((f"b{i}", schedules.DEFAULT_ARTIST_ID, f"Customer {i}", str(day), start_utc.isoformat(), end_utc.isoformat(),
+                     db.to_epoch(start_utc), db.to_epoch(end_utc)))
+    with db.transaction(conn):
+        conn.executemany("INSERT INTO bookings (id, artist_id, name, date, start_dt, end_dt, start_ts, end_ts, "
+                         "deposit_paid) VALUES (?,?,?,?,?,?,?,?,1)", rows)
+    conn.close()
+
+
+class Session:
+    # One browser session: widget state and registered fragments survive across reruns, as in AppSession
+    def __init__(self, script_path):
+        self.script_path = script_path
+        self.state = SafeSessionState(SessionState(), lambda: None)
+        self.pages = PagesManager(script_path, setup_watcher=False)
+        self.fragments = None
+
+    def rerun(self, fragment_id=None):
+        runner = LocalScriptRunner(self.script_path, self.state, self.pages)
+        if self.fragments is not None:
+            runner._fragment_storage = self.fragments
+        self.fragments = runner._fragment_storage
+        started = time.perf_counter()
+        runner.request_rerun(RerunData(fragment_id_queue=[fragment_id] if fragment_id else []))
+        runner.start()
+        while not runner.script_stopped():
+            time.sleep(0.0005)
+        elapsed = time.perf_counter() - started
+        return elapsed, sum(msg.ByteSize() for msg in runner.forward_msgs())
+
+
+def measure(session, runs, fragment_id=None):
+    samples = [session.rerun(fragment_id) for _ in range(runs)]
+    times = sorted(t * 1000 for t, _ in samples)
+    return statistics.median(times), times[max(0, int(len(times) * 0.95) - 1)], samples[-1][1]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--bookings", type=int, default=500)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--before-ref", help="git revision whose app.py is timed as the full-rerun baseline")
+    args = parser.parse_args()
+
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+    runtime = MagicMock(spec=Runtime)
+    runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    runtime.cache_storage_manager = MemoryCacheStorageManager()
+    Runtime._instance = runtime
+    secrets = Secrets([])
+    secrets._secrets = {"STRIPE_SECRET_KEY": "sk_test_bench"}
+    st.secrets = secrets
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in os.listdir(ROOT):
+            if name.endswith(".py") or name == assets.STYLES_SOURCE:
+                shutil.copy(os.path.join(ROOT, name), tmp)
+        # app.py inlines the built stylesheet and font from static/ (see assets.py)
+        shutil.copytree(os.path.join(ROOT, assets.STATIC_DIR), os.path.join(tmp, assets.STATIC_DIR))
+        os.chdir(tmp)
+        sys.path.insert(0, tmp)
+        seed(os.path.join(tmp, db.DB_PATH), args.bookings)
+
+        results = []
+        session = Session(os.path.join(tmp, "app.py"))
+        session.rerun()
+        # Registered in call order: availability_calendar, then booking_section
+        calendar_id, booking_id = list(session.fragments._fragments)
+        results.append(("full rerun", measure(session, args.runs)))
+        results.append(("calendar fragment", measure(session, args.runs, calendar_id)))
+        results.append(("booking fragment", measure(session, args.runs, booking_id)))
+
+        if args.before_ref:
+            before = os.path.join(tmp, "app_before.py")
+            with open(before, "wb") as f:
+                f.write(subprocess.check_output(["git", "-C", ROOT, "show", f"{args.before_ref}:app.py"]))
+            session = Session(before)
+            session.rerun()
+            results.insert(0, (f"full rerun @ {args.before_ref}", measure(session, args.runs)))
+
+    print(f"bookings={args.bookings} runs={args.runs}")
+    print(f"{'rerun':<28}  {'p50':>9}  {'p95':>9}  {'payload':>9}")
+    for label, (p50, p95, size) in results:
+        print(f"{label:<28}  {p50:>7.1f}ms  {p95:>7.1f}ms  {size:>8}B")
+
+
+if __name__ == "__main__":
+    main()
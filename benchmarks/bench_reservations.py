@@ -0,0 +1,88 @@
+# bench_reservations.py — concurrent reserve + confirm stress test
+#   python benchmarks/bench_reservations.py [--threads 16] [--attempts 500] [--days 5] [--database-url postgresql://...]
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import pytz
+import db
+import reservations
+from backends import add_argument, scratch_database
+
+STUDIO_TZ = pytz.timezone("America/Los_Angeles")
+
+DOUBLE_BOOKINGS = """
+    SELECT COUNT(*) FROM bookings a JOIN bookings b
+    ON a.id < b.id AND a.start_ts < b.end_ts AND b.start_ts < a.end_ts
+    WHERE a.deposit_paid = 1 AND b.deposit_paid = 1
+"""
+
+
+def customer(path, attempts, days, stats, lock, barrier):
+    conn = db.get_conn(path)
+    first_day = datetime.now(STUDIO_TZ).date() + timedelta(days=1)
+    reserved = confirmed = taken = 0
+    barrier.wait()
+    for _ in range(attempts):
+        day = first_day + timedelta(days=random.randrange(days))
+        start = STUDIO_TZ.localize(datetime.combine(day, datetime.min.time()) + timedelta(hours=12, minutes=30 * random.randrange(14)))
+        end = start + timedelta(minutes=30 * random.randint(1, 4))
+        bid = str(uuid.uuid4())
+        try:
+            reservations.reserve(conn, bid, "Load", 30, "555", "load@example.com", "stress",
+                                 str(day), "", start, end)
+        except reservations.SlotTaken:
+            taken += 1
+            continue
+        reserved += 1
+        if reservations.confirm(conn, bid):
+            confirmed += 1
+    with lock:
+        stats["reserved"] += reserved
+        stats["confirmed"] += confirmed
+        stats["taken"] += taken
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--attempts", type=int, default=500, help="attempts per thread")
+    parser.add_argument("--days", type=int, default=5, help="spread of days customers compete over")
+    add_argument(parser)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp, scratch_database(tmp, args.database_url, "stress.db") as path:
+        db.connect(path).close()
+        stats = {"reserved": 0, "confirmed": 0, "taken": 0}
+        lock = threading.Lock()
+        barrier = threading.Barrier(args.threads + 1)
+        threads = [threading.Thread(target=customer, args=(path, args.attempts, args.days, stats, lock, barrier))
+                   for _ in range(args.threads)]
+        for t in threads:
+            t.start()
+        barrier.wait()
+        started = time.perf_counter()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - started
+
+        conn = db.connect(path)
+        double_booked = conn.execute(DOUBLE_BOOKINGS).fetchone()[0]
+
+    attempts = args.threads * args.attempts
+    print(f"threads={args.threads} attempts={attempts} elapsed={elapsed:.2f}s")
+    print(f"reserved={stats['reserved']} confirmed={stats['confirmed']} rejected={stats['taken']}")
+    print(f"attempts/s={attempts / elapsed:.0f} bookings/s={stats['reserved'] / elapsed:.0f}")
+    print(f"double_bookings={double_booked}")
+    sys.exit(1 if double_booked else 0)
+
+
+if __name__ == "__main__":
+    main()
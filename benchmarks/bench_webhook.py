@@ -0,0 +1,141 @@
+# bench_webhook.py — burst load against the production webhook server (gunicorn + gthread)
+#   python benchmarks/bench_webhook.py [--events 2000] [--concurrency 32] [--workers 4] [--database-url postgresql://...]
+#   python benchmarks/bench_webhook.py --url http://host:5000/webhook --secret whsec_...   (existing server)
+import argparse
+import hashlib
+import hmac
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from datetime import datetime, timedelta
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import pytz
+import db
+import reservations
+from backends import add_argument, scratch_database
+
+STUDIO_TZ = pytz.timezone("America/Los_Angeles")
+SECRET = "whsec_bench"
+
+
+def seed_bookings(path, count):
+    conn = db.connect(path)
+    first = STUDIO_TZ.localize(datetime.combine(datetime.now(STUDIO_TZ).date() + timedelta(days=1), datetime.min.time()))
+    ids = []
+    for i in range(count):
+        start = first + timedelta(days=i // 8, hours=12 + i % 8)
+        ids.append(reservations.reserve(conn, str(uuid.uuid4()), f"Load {i}", 30, "555", f"load{i}@example.com",
+                                        "bench", str(start.date()), "", start, start + timedelta(hours=1)))
+    conn.close()
+    return ids
+
+
+def signed(event, secret):
+    body = json.dumps(event)
+    ts = int(time.time())
+    sig = hmac.new(secret.encode(), f"{ts}.{body}".encode(), hashlib.sha256).hexdigest()
+    return body, {"Stripe-Signature": f"t={ts},v1={sig}", "Content-Type": "application/json"}
+
+
+def completed_event(booking_id):
+    return {
+        "id": f"evt_{uuid.uuid4().hex}", "object": "event", "type": "checkout.session.completed",
+        "data": {"object": {"object": "checkout.session", "id": f"cs_{uuid.uuid4().hex}",
+                            "metadata": {"booking_id": booking_id}}}
+    }
+
+
+def wait_for_server(url, timeout=20):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            requests.post(url, data=b"{}", timeout=1)
+            return
+        except (requests.ConnectionError, requests.Timeout):
+            time.sleep(0.2)
+    raise RuntimeError(f"server at {url} did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=4, help="gunicorn workers when starting a local server")
+    parser.add_argument("--url", help="existing webhook endpoint; skips starting gunicorn")
+    parser.add_argument("--secret", default=SECRET)
+    parser.add_argument("--port", type=int, default=5077)
+    add_argument(parser)
+    args = parser.parse_args()
+
+    stack = ExitStack()
+    tmp = stack.enter_context(tempfile.TemporaryDirectory())
+    server = None
+    db_path = stack.enter_context(scratch_database(tmp, args.database_url, db.DB_PATH))
+    if args.url:
+        url = args.url
+        booking_ids = [str(uuid.uuid4()) for _ in range(args.events)]
+    else:
+        booking_ids = seed_bookings(db_path, args.events)
+        url = f"http://127.0.0.1:{args.port}/webhook"
+        env = dict(os.environ, STRIPE_SECRET_KEY="sk_test_bench", STRIPE_WEBHOOK_SECRET=args.secret,
+                   ICLOUD_USER="bench", ICLOUD_PASS="bench", CALDAV_URL="http://127.0.0.1:9",
+                   DATABASE_URL=db_path, PORT=str(args.port), WEB_CONCURRENCY=str(args.workers), PYTHONPATH=ROOT)
+        server = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "-c", os.path.join(ROOT, "gunicorn.conf.py"),
+             "--access-logfile", "/dev/null", "webhook:app"],
+            cwd=tmp, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+    try:
+        wait_for_server(url)
+        local = threading.local()
+        latencies = []
+
+        def deliver(booking_id):
+            session = getattr(local, "session", None) or requests.Session()
+            local.session = session
+            body, headers = signed(completed_event(booking_id), args.secret)
+            t = time.perf_counter()
+            r = session.post(url, data=body, headers=headers, timeout=10)
+            latencies.append((time.perf_counter() - t) * 1000)
+            return r.status_code
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(args.concurrency) as pool:
+            statuses = list(pool.map(deliver, booking_ids))
+        elapsed = time.perf_counter() - started
+
+        latencies.sort()
+        print(f"events={len(statuses)} concurrency={args.concurrency} non-200={sum(s != 200 for s in statuses)}")
+        print(f"events/s={len(statuses) / elapsed:.0f}")
+        print(f"ack latency ms: p50={statistics.median(latencies):.1f} "
+              f"p95={latencies[int(len(latencies) * 0.95) - 1]:.1f} p99={latencies[int(len(latencies) * 0.99) - 1]:.1f}")
+
+        if server:
+            # How long the dispatchers take to apply the burst after the last ack
+            conn = db.connect(db_path)
+            while conn.execute("SELECT COUNT(*) FROM stripe_events WHERE status = 'pending'").fetchone()[0]:
+                time.sleep(0.05)
+            drained = time.perf_counter() - started
+            paid = conn.execute("SELECT COUNT(*) FROM bookings WHERE deposit_paid = 1").fetchone()[0]
+            print(f"applied all events after {drained:.2f}s; bookings paid={paid}")
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+        stack.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+# blobstore.py — content-addressed upload store: one blob per distinct file, shared across bookings
+import hashlib
+import os
+import tempfile
+from datetime import datetime
+import db
+import images
+
+# Shared by the app (stores uploads) and whichever process queues the confirmation email (attaches them)
+UPLOAD_DIR = "uploads"
+CHUNK_SIZE = 64 * 1024
+GC_BATCH_SIZE = 200
+
+
+def blob_root(upload_dir):
+    return os.path.join(upload_dir, "blobs")
+
+
+def blob_path(upload_dir, digest):
+    return os.path.join(blob_root(upload_dir), digest[:2], digest)
+
+
+def _stream_to_temp(upload_dir, fileobj):
+    # Hash while writing so the file is read exactly once, CHUNK_SIZE bytes at a time
+    tmp_dir = os.path.join(blob_root(upload_dir), "tmp")
+    os.makedirs(tmp_dir, exist_ok=True)
+    sha = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+    fileobj.seek(0)
+    with os.fdopen(fd, "wb") as out:
+        while True:
+            chunk = fileobj.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            sha.update(chunk)
+            out.write(chunk)
+            size += len(chunk)
+    return sha.hexdigest(), size, tmp_path
+
+
+def blob_lock_key(digest):
+    return int(digest[:15], 16)
+
+
+def store_upload(conn, upload_dir, bid, fileobj, filename, mime):
+    digest, size, tmp_path = _stream_to_temp(upload_dir, fileobj)
+    with db.transaction(conn):
+        db.lock(conn, blob_lock_key(digest))
+        conn.execute(
+            "INSERT INTO attachments (hash, size, mime, refcount, created_at) VALUES (?, ?, ?, 0, ?) "
+            "ON CONFLICT (hash) DO NOTHING",
+            (digest, size, mime, datetime.utcnow().isoformat())
+        )
+        linked = conn.execute(
+            "INSERT INTO booking_attachments (booking_id, hash, filename) VALUES (?, ?, ?) "
+            "ON CONFLICT (booking_id, hash) DO NOTHING",
+            (bid, digest, filename)
+        ).rowcount
+        if linked:
+            conn.execute("UPDATE attachments SET refcount = refcount + 1 WHERE hash = ?", (digest,))
+
+    # Placed after the refcount is taken, so collect_orphans can't delete it underneath us
+    path = blob_path(upload_dir, digest)
+    if os.path.exists(path):
+        os.remove(tmp_path)
+    else:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_path, path)
+    return path, filename
+
+
+def files_for_booking(conn, upload_dir, bid):
+    rows = conn.execute(
+        "SELECT hash, filename FROM booking_attachments WHERE booking_id = ?", (bid,)
+    ).fetchall()
+    if rows:
+        return [(blob_path(upload_dir, digest), filename) for digest, filename in rows]
+    # Bookings made before the blob store kept a comma-joined path list
+    legacy = conn.execute("SELECT files FROM bookings WHERE id = ?", (bid,)).fetchone()
+    return [(path, os.path.basename(path)) for path in (legacy[0] or "").split(",") if path] if legacy else []
+
+
+def release_booking(conn, bid):
+    # Call inside the transaction that deletes the booking
+    conn.execute(
+        "UPDATE attachments SET refcount = refcount - 1 "
+        "WHERE hash IN (SELECT hash FROM booking_attachments WHERE booking_id = ?)",
+        (bid,)
+    )
+    conn.execute("DELETE FROM booking_attachments WHERE booking_id = ?", (bid,))
+
+
+def collect_orphans(conn, upload_dir, batch_size=GC_BATCH_SIZE):
+    collected = 0
+    while True:
+        with db.transaction(conn):
+            # Served by idx_attachments_orphans
+            digests = [row[0] for row in conn.execute(
+                "SELECT hash FROM attachments WHERE refcount <= 0 LIMIT ?", (batch_size,)
+            )]
+            for digest in digests:
+                db.lock(conn, blob_lock_key(digest))
+                if conn.execute("DELETE FROM attachments WHERE hash = ? AND refcount <= 0", (digest,)).rowcount:
+                    # Unlinked while holding the write lock so a concurrent store_upload re-places the file
+                    path = blob_path(upload_dir, digest)
+                    for p in (path,) + images.variant_paths(path):
+                        if os.path.exists(p):
+                            os.remove(p)
+        collected += len(digests)
+        if len(digests) < batch_size:
+            return collected
@@ -0,0 +1,180 @@
+# build_assets.py — resized WebP/AVIF images, the header font subset and the minified styles.css, into static/
+# Run after changing styles.css, the logo or the background, then commit static/:
+#   pip install "fonttools[woff]" pillow-avif-plugin    # build-time only; the app doesn't import either
+#   python build_assets.py [--background background.png] [--font "fonts/DancingScript[wght].ttf"]
+# The font source is committed under fonts/ with its SIL OFL licence, so it builds offline. A missing background
+# is downloaded once from SOURCE_URLS. Whatever still can't be built (or AVIF, without the plugin) is left out of
+# the manifest, and assets.py keeps serving that asset's remote URL.
+import argparse
+import hashlib
+import io
+import json
+import os
+import re
+import requests
+from PIL import Image
+import assets
+
+LOGO_SOURCE = "logo.PNG"
+BACKGROUND_SOURCE = "background.png"
+FONT_SOURCE = os.path.join("fonts", "DancingScript[wght].ttf")
+SOURCE_URLS = {
+    BACKGROUND_SOURCE: assets.REMOTE_BACKGROUND,
+    FONT_SOURCE: "https://github.com/google/fonts/raw/main/ofl/dancingscript/DancingScript%5Bwght%5D.ttf",
+}
+
+# 1x and 2x of the 360px logo; the background sits under an 86% black overlay, so it takes low quality well
+LOGO_WIDTHS = (assets.LOGO_WIDTH, assets.LOGO_WIDTH * 2)
+BACKGROUND_WIDTHS = (1280, 1920, 2560)
+QUALITY = {"logo": {"webp": 82, "avif": 60}, "background": {"webp": 55, "avif": 40}}
+# The font only draws the "Cashin Ink" header
+FONT_TEXT = "Cashin Ink"
+FONT_FILE = "dancing-script-700.woff2"
+
+
+def avif_available():
+    try:
+        import pillow_avif  # noqa: F401 — registers the AVIF encoder with Pillow
+        return True
+    except ImportError:
+        return False
+
+
+def fetch_source(path):
+    if os.path.exists(path):
+        return path
+    if path not in SOURCE_URLS:
+        return None
+    try:
+        response = requests.get(SOURCE_URLS[path], timeout=30)
+        response.raise_for_status()
+    except requests.RequestException as e:
+        print(f"Couldn't download {path}: {e}")
+        return None
+    with open(path, "wb") as f:
+        f.write(response.content)
+    return path
+
+
+def save(image, name, kind, quality, out_dir):
+    buf = io.BytesIO()
+    if kind == "webp":
+        image.save(buf, "WEBP", quality=quality, method=6)
+    else:
+        image.save(buf, "AVIF", quality=quality, speed=4)
+    with open(os.path.join(out_dir, name), "wb") as f:
+        f.write(buf.getvalue())
+    return name
+
+
+def build_image(source, prefix, widths, quality, kinds, out_dir, mode=None):
+    # {kind: {width: filename}}; widths past the source's own collapse into one variant at the source width
+    image = Image.open(source)
+    if mode:
+        image = image.convert(mode)
+    variants = {kind: {} for kind in kinds}
+    for width in sorted({min(width, image.width) for width in widths}):
+        height = round(image.height * width / image.width)
+        resized = image.resize((width, height), Image.LANCZOS) if width != image.width else image
+        for kind in kinds:
+            variants[kind][str(width)] = save(resized, f"{prefix}-{width}.{kind}", kind, quality[kind], out_dir)
+    return variants, image.width, image.height
+
+
+def build_font(source, out_dir):
+    from fontTools import subset
+    from fontTools.ttLib import TTFont
+    from fontTools.varLib import instancer
+
+    font = TTFont(source)
+    if "fvar" in font:
+        font = instancer.instantiateVariableFont(font, {"wght": 700})
+    options = subset.Options()
+    options.flavor = "woff2"
+    options.layout_features = ["*"]
+    subsetter = subset.Subsetter(options)
+    subsetter.populate(text=FONT_TEXT)
+    subsetter.subset(font)
+    # Keep head.modified from the source so an unchanged font rebuilds byte for byte
+    font.recalcTimestamp = False
+    subset.save_font(font, os.path.join(out_dir, FONT_FILE), options)
+    return FONT_FILE
+
+
+def minify_css(css):
+    # Comments and layout whitespace only; values and selectors are left as written
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    css = re.sub(r"\s+", " ", css)
+    css = re.sub(r"\s*([{};,>])\s*", r"\1", css)
+    css = re.sub(r":\s+", ":", css)
+    css = re.sub(r"\s*!important", "!important", css)
+    return css.replace(";}", "}").strip()
+
+
+def version(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()[:12]
+
+
+def clean(out_dir):
+    # Files from the previous build; anything else in static/ is left alone
+    old = assets.load_manifest(os.path.join(out_dir, "manifest.json"))
+    for name in list(old.get("versions", {})) + ["app.min.css", "manifest.json"]:
+        path = os.path.join(out_dir, name)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logo", default=LOGO_SOURCE)
+    parser.add_argument("--background", default=BACKGROUND_SOURCE)
+    parser.add_argument("--font", default=FONT_SOURCE)
+    parser.add_argument("--out", default=assets.STATIC_DIR)
+    args = parser.parse_args()
+
+    os.makedirs(args.out, exist_ok=True)
+    clean(args.out)
+    kinds = ("avif", "webp") if avif_available() else ("webp",)
+    if "avif" not in kinds:
+        print("pillow-avif-plugin not installed; building WebP only")
+
+    manifest = {}
+    logo, width, height = build_image(args.logo, "logo", LOGO_WIDTHS, QUALITY["logo"], kinds, args.out)
+    manifest["logo"] = dict(logo, height=round(height * assets.LOGO_WIDTH / width))
+
+    background = fetch_source(args.background)
+    if background:
+        manifest["background"], _, _ = build_image(background, "background", BACKGROUND_WIDTHS,
+                                                   QUALITY["background"], kinds, args.out, mode="RGB")
+    else:
+        print("No background source; the page keeps the remote background")
+
+    font = fetch_source(args.font)
+    if font:
+        manifest["font"] = build_font(font, args.out)
+    else:
+        print("No font source; the page keeps the Google Fonts stylesheet")
+
+    built = [name for entry in (manifest.get("logo", {}), manifest.get("background", {}))
+             for kind in kinds for name in entry.get(kind, {}).values()]
+    built += [manifest["font"]] if "font" in manifest else []
+    manifest["versions"] = {name: version(os.path.join(args.out, name)) for name in sorted(built)}
+
+    # assets.stylesheet() puts the font and background rules in front at runtime
+    with open(assets.STYLES_SOURCE) as f:
+        css = minify_css(f.read())
+    with open(os.path.join(args.out, "app.min.css"), "w") as f:
+        f.write(css)
+    with open(os.path.join(args.out, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+    print(f"{'file':<32} {'bytes':>9}")
+    for name in sorted(built) + ["app.min.css"]:
+        print(f"{name:<32} {os.path.getsize(os.path.join(args.out, name)):>9}")
+    print(f"{'(source) ' + args.logo:<32} {os.path.getsize(args.logo):>9}")
+    print(f"{'(source) ' + assets.STYLES_SOURCE:<32} {os.path.getsize(assets.STYLES_SOURCE):>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+# calendar_sync.py — durable queue of CalDAV writes, drained in batches by a background worker
+import os
+import threading
+import time
+from datetime import datetime
+import caldav
+import pytz
+import db
+import metrics
+
+CALDAV_URL = os.environ.get("CALDAV_URL", "https://caldav.icloud.com")
+BATCH_SIZE = 25
+MAX_ATTEMPTS = 8
+LEASE_SECONDS = 300
+
+_calendar = None
+_calendar_lock = threading.Lock()
+
+
+def get_calendar():
+    # Discovery (principal + calendar list) runs on first use, not at import, and is then cached
+    global _calendar
+    with _calendar_lock:
+        if _calendar is None:
+            client = caldav.DAVClient(
+                url=CALDAV_URL,
+                username=os.environ["ICLOUD_USER"],
+                password=os.environ["ICLOUD_PASS"]  # ← App-Specific Password
+            )
+            _calendar = client.principal().calendars()[0]
+        return _calendar
+
+
+def reset_calendar():
+    global _calendar
+    with _calendar_lock:
+        _calendar = None
+
+
+def _escape(text):
+    return (text or "").replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\n", "\\n")
+
+
+def render_vevent(uid, name, desc, start_ts, end_ts, stamp_ts=None):
+    # Fixed UID per booking: a retried write replaces the event instead of duplicating it,
+    # and the ICS feed's copy of a booking is the same event as the CalDAV one
+    fmt = '%Y%m%dT%H%M%SZ'
+    stamp = datetime.fromtimestamp(stamp_ts, pytz.UTC) if stamp_ts else datetime.now(pytz.UTC)
+    return "\r\n".join([
+        "BEGIN:VEVENT",
+        f"UID:{uid}@cashin-ink",
+        f"DTSTAMP:{stamp.strftime(fmt)}",
+        f"SUMMARY:Tattoo - {_escape(name)}",
+        f"DESCRIPTION:{_escape(desc)}",
+        f"DTSTART:{datetime.fromtimestamp(start_ts, pytz.UTC).strftime(fmt)}",
+        f"DTEND:{datetime.fromtimestamp(end_ts, pytz.UTC).strftime(fmt)}",
+        "STATUS:CONFIRMED",
+        "END:VEVENT",
+    ])
+
+
+def render_calendar(vevents):
+    return "\r\n".join(["BEGIN:VCALENDAR", "VERSION:2.0", "PRODID:-//Cashin Ink//Bookings//EN",
+                         *vevents, "END:VCALENDAR"]) + "\r\n"
+
+
+def render_event(uid, name, desc, start_ts, end_ts):
+    return render_calendar([render_vevent(uid, name, desc, start_ts, end_ts)])
+
+
+def enqueue(conn, booking_id, name, desc, start_ts, end_ts):
+    with db.transaction(conn):
+        conn.execute(
+            "INSERT INTO calendar_jobs (booking_id, name, description, start_ts, end_ts, status, attempts, "
+            "next_attempt_ts, created_at) VALUES (?, ?, ?, ?, ?, 'pending', 0, ?, ?)",
+            (booking_id, name, desc, start_ts, end_ts, int(time.time()), datetime.utcnow().isoformat())
+        )
+
+
+def claim_due(conn, limit, now=None):
+    return db.claim_due(conn, "calendar_jobs", ("booking_id", "name", "description", "start_ts", "end_ts"),
+                        limit, LEASE_SECONDS, now=now)
+
+
+def process_due(conn, batch_size=BATCH_SIZE, now=None):
+    jobs = claim_due(conn, batch_size, now)
+    if not jobs:
+        return 0
+    done, failed = [], []
+    for index, (jid, booking_id, name, desc, start_ts, end_ts, attempts) in enumerate(jobs):
+        try:
+            with metrics.timed("caldav_write", booking_id=booking_id):
+                get_calendar().save_event(render_event(booking_id, name, desc, start_ts, end_ts))
+            done.append(jid)
+            print(f"Added to calendar: {name} on {datetime.fromtimestamp(start_ts, pytz.UTC).strftime('%b %d %H:%M UTC')}")
+        except Exception as e:
+            # Server unreachable or session gone: back off the rest of the batch too
+            reset_calendar()
+            print("Calendar sync failed:", e)
+            failed = [(job[0], job[6], e) for job in jobs[index:]]
+            break
+
+    with db.transaction(conn):
+        conn.executemany(
+            "UPDATE calendar_jobs SET status = 'done', last_error = NULL WHERE id = ?",
+            [(jid,) for jid in done]
+        )
+        db.retry_later(conn, "calendar_jobs", failed, MAX_ATTEMPTS)
+    return len(done)
+
+
+def start_worker(interval=5, path=db.DB_PATH):
+    def run():
+        while True:
+            try:
+                if process_due(db.get_conn(path)) < BATCH_SIZE:
+                    time.sleep(interval)
+            except Exception as e:
+                print("Calendar worker failed:", e)
+                time.sleep(interval)
+
+    thread = threading.Thread(target=run, name="calendar-sync", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,115 @@
+# checkout.py — Stripe Checkout creation: idempotent per booking, reuses open sessions, bounded latency
+import time
+import stripe
+import holds
+import metrics
+import reservations
+import webhook_events
+
+DEPOSIT_CENTS = reservations.DEPOSIT_CENTS
+REQUEST_TIMEOUT_SECONDS = 10
+MAX_ATTEMPTS = 3
+BACKOFF_BASE_SECONDS = 0.5
+# Safe to retry: the idempotency key turns a repeated create into a replay of the first one.
+# IdempotencyError (the key reused with different parameters) fails the same way every time.
+RETRYABLE = (stripe.error.APIConnectionError, stripe.error.RateLimitError, stripe.error.APIError)
+
+
+class CheckoutUnavailable(Exception):
+    pass
+
+
+class AlreadyPaid(Exception):
+    # The booking's session completed on Stripe's side before the webhook or success page recorded it
+    pass
+
+
+class PaymentProcessing(Exception):
+    # The session completed but its payment hasn't cleared (or has failed); the hold stays until Stripe decides
+    pass
+
+
+def configure(api_key):
+    stripe.api_key = api_key
+    stripe.default_http_client = stripe.http_client.RequestsClient(timeout=REQUEST_TIMEOUT_SECONDS)
+    # Retries are done here so the backoff is ours; the library would otherwise retry silently too
+    stripe.max_network_retries = 0
+
+
+def idempotency_key(bid):
+    return f"checkout-{bid}"
+
+
+def with_retries(call):
+    for attempt in range(MAX_ATTEMPTS):
+        try:
+            return call()
+        except RETRYABLE:
+            if attempt == MAX_ATTEMPTS - 1:
+                raise
+            time.sleep(BACKOFF_BASE_SECONDS * 2 ** attempt)
+
+
+def is_paid(session_id):
+    # Stripe redirects to the success page when a session completes, including one whose payment hasn't cleared
+    try:
+        session = with_retries(lambda: stripe.checkout.Session.retrieve(session_id))
+    except stripe.error.StripeError:
+        return False
+    return session.payment_status == "paid"
+
+
+def session_for_booking(conn, bid, name, email, success_url, cancel_url):
+    with metrics.timed("checkout_session", booking_id=bid):
+        return _session_for_booking(conn, bid, name, email, success_url, cancel_url)
+
+
+def _session_for_booking(conn, bid, name, email, success_url, cancel_url):
+    session_id, hold_expires_ts = conn.execute(
+        "SELECT stripe_session_id, hold_expires_ts FROM bookings WHERE id = ?", (bid,)
+    ).fetchone()
+
+    if session_id:
+        try:
+            session = with_retries(lambda: stripe.checkout.Session.retrieve(session_id))
+        except stripe.error.StripeError as e:
+            raise CheckoutUnavailable(str(e)) from e
+        if session.status == "open":
+            return session
+        if session.status == "complete":
+            if session.payment_status != "paid":
+                raise PaymentProcessing(f"checkout session {session_id} is {session.payment_status}")
+            # Paid, but neither the webhook nor the success page has confirmed it yet
+            webhook_events.confirm_paid(conn, bid)
+            raise AlreadyPaid(f"checkout session {session_id} is complete")
+        if session.status == "expired":
+            # This hold can't be paid any more; the next reaper pass collects it
+            holds.expire(conn, bid)
+        raise CheckoutUnavailable(f"checkout session {session_id} is {session.status}")
+
+    try:
+        session = with_retries(lambda: stripe.checkout.Session.create(
+            payment_method_types=["card"],
+            line_items=[{
+                "price_data": {
+                    "currency": "usd",
+                    "product_data": {"name": f"Deposit – {name}"},
+                    "unit_amount": DEPOSIT_CENTS
+                },
+                "quantity": 1
+            }],
+            mode="payment",
+            success_url=success_url,
+            cancel_url=cancel_url,
+            metadata={"booking_id": bid},
+            customer_email=email,
+            # Derived from the hold so a replayed request carries identical parameters
+            expires_at=hold_expires_ts - holds.HOLD_GRACE_SECONDS,
+            idempotency_key=idempotency_key(bid)
+        ))
+    except stripe.error.StripeError as e:
+        holds.expire(conn, bid)
+        raise CheckoutUnavailable(str(e)) from e
+
+    reservations.attach_session(conn, bid, session.id)
+    return session
@@ -0,0 +1,446 @@
+# db.py — shared storage access (SQLite by default, Postgres via DATABASE_URL) and versioned schema migrations
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from datetime import datetime
+import pytz
+
+# A SQLite file (one host) or a postgres:// URL (any number of app / webhook replicas)
+DB_PATH = os.environ.get("DATABASE_URL", "bookings.db")
+
+
+def parse_utc(value):
+    # Older rows were written naive, newer ones carry a +00:00 offset
+    dt = datetime.fromisoformat(value)
+    if dt.tzinfo is None:
+        return pytz.UTC.localize(dt)
+    return dt.astimezone(pytz.UTC)
+
+
+def to_epoch(dt):
+    return int(dt.timestamp())
+
+
+def is_postgres(path):
+    return path.startswith(("postgres://", "postgresql://"))
+
+
+def dialect(conn):
+    return getattr(conn, "dialect", "sqlite")
+
+
+_migrated = set()
+
+
+def connect(path=DB_PATH):
+    if is_postgres(path):
+        import db_postgres
+        conn = db_postgres.connect(path)
+        if path not in _migrated:
+            migrate(conn)
+            _migrated.add(path)
+        return conn
+
+    conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+    conn.execute("PRAGMA synchronous=NORMAL")
+    # Schema check, migrations and WAL switch run once per process and database, not per connection
+    if path not in _migrated:
+        # WAL lets Streamlit sessions read while another session or the webhook writes
+        conn.execute("PRAGMA journal_mode=WAL")
+        migrate(conn)
+        _migrated.add(path)
+    return conn
+
+
+_local = threading.local()
+
+
+def get_conn(path=DB_PATH):
+    # One connection per thread (Streamlit session runner, Flask worker, background job)
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+    if path not in conns:
+        conns[path] = connect(path)
+    return conns[path]
+
+
+@contextmanager
+def transaction(conn):
+    # Nested use joins the enclosing transaction, so helpers that write can be
+    # composed into one atomic unit by the caller
+    if conn.in_transaction:
+        yield conn
+        return
+    if dialect(conn) == "postgres":
+        # Writers run concurrently; read-check-write blocks serialize with lock_span()
+        conn.begin()
+    else:
+        # IMMEDIATE takes the write lock up front, so a read-check-write inside the block is atomic
+        conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+
+
+# Inside a transaction, the helpers below make a read-check-write atomic against other writers.
+# SQLite's BEGIN IMMEDIATE already serializes every writer, so there they do nothing.
+def lock(conn, key, subkey=None):
+    # Transaction-scoped advisory lock on a bigint key, or on a pair of int4 keys (a separate key space)
+    if dialect(conn) != "postgres":
+        return
+    if subkey is None:
+        conn.execute("SELECT pg_advisory_xact_lock(?)", (key,))
+    else:
+        conn.execute("SELECT pg_advisory_xact_lock(?, ?)", (key, subkey))
+
+
+def lock_span(conn, start_ts, end_ts, partition=""):
+    # Overlapping spans in one partition (an artist's chair) share at least one UTC-day bucket; buckets are
+    # locked in ascending order. Different partitions lock different (partition, bucket) pairs.
+    space = zlib.crc32(partition.encode()) - (1 << 31)
+    for bucket in range(start_ts // 86400, (max(end_ts, start_ts + 1) - 1) // 86400 + 1):
+        lock(conn, space, bucket)
+
+
+def skip_locked(conn):
+    # Appended to a work-queue claim SELECT so concurrent workers take disjoint rows
+    return " FOR UPDATE SKIP LOCKED" if dialect(conn) == "postgres" else ""
+
+
+# Work queues (outbox, calendar_jobs, stripe_events) share one row lifecycle: 'pending' rows are due at
+# next_attempt_ts, a claim leases them, a failure backs off, and a row out of attempts is left 'failed'
+QUEUE_BACKOFF_BASE_SECONDS = 30
+QUEUE_BACKOFF_MAX_SECONDS = 3600
+
+
+def backoff(attempts):
+    return min(QUEUE_BACKOFF_BASE_SECONDS * 2 ** (attempts - 1), QUEUE_BACKOFF_MAX_SECONDS)
+
+
+def claim_due(conn, table, columns, limit, lease_seconds, key="id", now=None):
+    # Rows come back as (key, *columns, attempts) with attempts already counting this claim. A row not
+    # finished within the lease is due again for any worker.
+    now = int(now or time.time())
+    with transaction(conn):
+        # Served by the table's (status, next_attempt_ts) index
+        rows = conn.execute(
+            f"SELECT {key}, {', '.join(columns)}, attempts + 1 FROM {table} "
+            "WHERE status = 'pending' AND next_attempt_ts <= ? ORDER BY next_attempt_ts LIMIT ?" + skip_locked(conn),
+            (now, limit)
+        ).fetchall()
+        conn.executemany(
+            f"UPDATE {table} SET attempts = attempts + 1, next_attempt_ts = ? WHERE {key} = ?",
+            [(now + lease_seconds, row[0]) for row in rows]
+        )
+    return rows
+
+
+def retry_later(conn, table, failures, max_attempts, key="id", now=None):
+    # failures are (key, attempts, error) for claimed rows
+    now = int(now or time.time())
+    with transaction(conn):
+        conn.executemany(
+            f"UPDATE {table} SET status = ?, next_attempt_ts = ?, last_error = ? WHERE {key} = ? AND status = 'pending'",
+            [("failed" if attempts >= max_attempts else "pending", now + backoff(attempts), str(error)[:500], row_key)
+             for row_key, attempts, error in failures]
+        )
+
+
+# Advisory lock keys; lock_span() uses the two-key space, so its buckets can't collide with these
+MIGRATION_LOCK_KEY = 0x6361736869
+METRICS_LOCK_KEY = 0x6361736870
+
+
+# ==================== MIGRATIONS ====================
+def _create_bookings(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS bookings (
+        id TEXT PRIMARY KEY, name TEXT, age INTEGER, phone TEXT, email TEXT, description TEXT,
+        date TEXT, time TEXT, start_dt TEXT, end_dt TEXT,
+        deposit_paid INTEGER DEFAULT 0, stripe_session_id TEXT, files TEXT, created_at TEXT
+    )''')
+
+
+def _add_epoch_span(conn):
+    # Integer UTC epochs for range queries; start_dt/end_dt are rewritten to one ISO format
+    conn.execute("ALTER TABLE bookings ADD COLUMN start_ts INTEGER")
+    conn.execute("ALTER TABLE bookings ADD COLUMN end_ts INTEGER")
+    rows = conn.execute("SELECT id, start_dt, end_dt FROM bookings").fetchall()
+    for bid, start_iso, end_iso in rows:
+        if not start_iso or not end_iso:
+            continue
+        start, end = parse_utc(start_iso), parse_utc(end_iso)
+        conn.execute(
+            "UPDATE bookings SET start_dt = ?, end_dt = ?, start_ts = ?, end_ts = ? WHERE id = ?",
+            (start.isoformat(), end.isoformat(), to_epoch(start), to_epoch(end), bid)
+        )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_bookings_paid_span ON bookings (deposit_paid, start_ts, end_ts)")
+
+
+def _add_hold_expiry(conn):
+    # Unpaid rows are holds that block their slot until hold_expires_ts. Rows already
+    # pending get Stripe's default 24h session lifetime from created_at.
+    conn.execute("ALTER TABLE bookings ADD COLUMN hold_expires_ts INTEGER")
+    rows = conn.execute("SELECT id, created_at FROM bookings WHERE deposit_paid = 0").fetchall()
+    for bid, created_at in rows:
+        created = to_epoch(parse_utc(created_at)) if created_at else 0
+        conn.execute("UPDATE bookings SET hold_expires_ts = ? WHERE id = ?", (created + 24 * 3600, bid))
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_bookings_hold_expiry ON bookings (deposit_paid, hold_expires_ts)")
+
+
+def _serial_pk(conn):
+    return "BIGSERIAL PRIMARY KEY" if dialect(conn) == "postgres" else "INTEGER PRIMARY KEY AUTOINCREMENT"
+
+
+def _create_outbox(conn):
+    conn.execute(f'''CREATE TABLE IF NOT EXISTS outbox (
+        id {_serial_pk(conn)}, to_addr TEXT, subject TEXT, body TEXT, attachments TEXT,
+        status TEXT DEFAULT 'pending', attempts INTEGER DEFAULT 0, next_attempt_ts INTEGER,
+        last_error TEXT, created_at TEXT, sent_at TEXT
+    )''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox (status, next_attempt_ts)")
+
+
+def _create_attachments(conn):
+    # Content-addressed blobs (refcounted) and the booking -> blob links
+    conn.execute('''CREATE TABLE IF NOT EXISTS attachments (
+        hash TEXT PRIMARY KEY, size INTEGER, mime TEXT, refcount INTEGER DEFAULT 0, created_at TEXT
+    )''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS booking_attachments (
+        booking_id TEXT, hash TEXT, filename TEXT, PRIMARY KEY (booking_id, hash)
+    )''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_attachments_orphans ON attachments (refcount)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_booking_attachments_hash ON booking_attachments (hash)")
+
+
+def _create_calendar_jobs(conn):
+    conn.execute(f'''CREATE TABLE IF NOT EXISTS calendar_jobs (
+        id {_serial_pk(conn)}, booking_id TEXT, name TEXT, description TEXT,
+        start_ts INTEGER, end_ts INTEGER, status TEXT DEFAULT 'pending', attempts INTEGER DEFAULT 0,
+        next_attempt_ts INTEGER, last_error TEXT, created_at TEXT
+    )''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_calendar_jobs_due ON calendar_jobs (status, next_attempt_ts)")
+
+
+def _create_stripe_events(conn):
+    # Ledger of processed Stripe event ids; a replayed delivery hits the primary key
+    conn.execute('''CREATE TABLE IF NOT EXISTS stripe_events (
+        event_id TEXT PRIMARY KEY, type TEXT, received_at TEXT
+    )''')
+
+
+def _add_stripe_event_payload(conn):
+    # Events are acked once stored and applied later; rows already in the ledger were applied inline
+    conn.execute("ALTER TABLE stripe_events ADD COLUMN received_ts INTEGER")
+    conn.execute("ALTER TABLE stripe_events ADD COLUMN payload TEXT")
+    conn.execute("ALTER TABLE stripe_events ADD COLUMN processed_at TEXT")
+    conn.execute("UPDATE stripe_events SET processed_at = received_at")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_stripe_events_pending ON stripe_events (processed_at, received_ts)")
+
+
+def _create_phase_metrics(conn):
+    # Latency histograms summed across processes; buckets is a JSON list of per-bucket counts
+    conn.execute('''CREATE TABLE IF NOT EXISTS phase_metrics (
+        phase TEXT NOT NULL, outcome TEXT NOT NULL, count INTEGER NOT NULL, sum_seconds REAL NOT NULL,
+        buckets TEXT NOT NULL, PRIMARY KEY (phase, outcome)
+    )''')
+
+
+def _add_confirmed_ts(conn):
+    # When the deposit was confirmed; the ICS feed serves changes since its last build from this.
+    # Already-paid rows take their creation time.
+    conn.execute("ALTER TABLE bookings ADD COLUMN confirmed_ts INTEGER")
+    rows = conn.execute("SELECT id, created_at FROM bookings WHERE deposit_paid = 1").fetchall()
+    for bid, created_at in rows:
+        conn.execute("UPDATE bookings SET confirmed_ts = ? WHERE id = ?",
+                     (to_epoch(parse_utc(created_at)) if created_at else 0, bid))
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_bookings_confirmed ON bookings (confirmed_ts)")
+
+
+def _add_reminders(conn):
+    conn.execute("ALTER TABLE bookings ADD COLUMN reminder_sent_ts INTEGER")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_bookings_reminder_due "
+                 "ON bookings (deposit_paid, reminder_sent_ts, start_ts)")
+    # One row per studio-local day whose digest has been queued
+    conn.execute('''CREATE TABLE IF NOT EXISTS reminder_digests (day TEXT PRIMARY KEY, sent_at TEXT)''')
+
+
+def _add_overlap_exclusion(conn):
+    # Postgres only: the database itself refuses two paid bookings with overlapping spans.
+    # SQLite has no equivalent; there confirm()'s conditional UPDATE under the write lock is the guard.
+    if dialect(conn) != "postgres":
+        return
+    conn.execute("ALTER TABLE bookings ADD CONSTRAINT bookings_paid_no_overlap "
+                 "EXCLUDE USING gist (int8range(start_ts, end_ts) WITH &&) WHERE (deposit_paid = 1)")
+
+
+def _backfill_analytics(conn, rows, deposit_cents, first_slot, slot_count):
+    # Fills daily_stats / slot_stats from bookings the way analytics.py's record_hold / record_paid would
+    # have. Frozen here with the migrations that call it, so their result doesn't move when analytics.py does.
+    # rows: (created_at, deposit_paid, confirmed_ts, start_ts, end_ts, timezone); slots are 30-minute clock
+    # slices, numbered from first_slot (24 = 12:00), and only slot_count of them are kept per day.
+    daily, by_slot = {}, {}
+    for created_at, deposit_paid, confirmed_ts, start_ts, end_ts, tz in rows:
+        tz = pytz.timezone(tz)
+        if created_at:
+            daily.setdefault(str(datetime.fromtimestamp(to_epoch(parse_utc(created_at)), tz).date()), [0, 0, 0, 0])[0] += 1
+        if not deposit_paid or start_ts is None or end_ts is None:
+            continue
+        totals = daily.setdefault(str(datetime.fromtimestamp(confirmed_ts or start_ts, tz).date()), [0, 0, 0, 0])
+        totals[1:] = [totals[1] + 1, totals[2] + end_ts - start_ts, totals[3] + deposit_cents]
+        ts = start_ts
+        while ts < end_ts:
+            local = datetime.fromtimestamp(ts, tz)
+            step = min(1800 - (local.minute % 30 * 60 + local.second), end_ts - ts)
+            slot = (local.hour * 60 + local.minute) // 30 - first_slot
+            if 0 <= slot < slot_count:
+                by_slot[(local.weekday(), slot)] = by_slot.get((local.weekday(), slot), 0) + step
+            ts += step
+    conn.execute("DELETE FROM daily_stats")
+    conn.execute("DELETE FROM slot_stats")
+    conn.executemany("INSERT INTO daily_stats (day, holds, paid, paid_seconds, deposit_cents) VALUES (?, ?, ?, ?, ?)",
+                     [(day, *totals) for day, totals in sorted(daily.items())])
+    conn.executemany("INSERT INTO slot_stats (weekday, slot, paid_seconds) VALUES (?, ?, ?)",
+                     [(weekday, slot, seconds) for (weekday, slot), seconds in sorted(by_slot.items())])
+
+
+def _create_analytics(conn):
+    # Running totals per studio-local day and per (weekday, 30-minute slot); see analytics.py
+    conn.execute('''CREATE TABLE IF NOT EXISTS daily_stats (
+        day TEXT PRIMARY KEY, holds INTEGER NOT NULL DEFAULT 0, paid INTEGER NOT NULL DEFAULT 0,
+        paid_seconds INTEGER NOT NULL DEFAULT 0, deposit_cents INTEGER NOT NULL DEFAULT 0
+    )''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS slot_stats (
+        weekday INTEGER, slot INTEGER, paid_seconds INTEGER NOT NULL DEFAULT 0, PRIMARY KEY (weekday, slot)
+    )''')
+    # As shipped: one studio in Los Angeles, $150 deposits, 16 slots counted from the 12:00 opening
+    rows = conn.execute(
+        "SELECT created_at, deposit_paid, confirmed_ts, start_ts, end_ts, 'America/Los_Angeles' FROM bookings"
+    ).fetchall()
+    _backfill_analytics(conn, rows, 15000, 24, 16)
+
+
+def _add_artists(conn):
+    # Locations carry a timezone and default hours; artists belong to a location and may override them.
+    # Existing bookings, digests and aggregates belong to the original single-chair studio.
+    conn.execute('''CREATE TABLE IF NOT EXISTS locations (
+        id TEXT PRIMARY KEY, name TEXT NOT NULL, timezone TEXT NOT NULL,
+        open_hour INTEGER NOT NULL, close_hour INTEGER NOT NULL, closed_weekdays TEXT NOT NULL DEFAULT ''
+    )''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS artists (
+        id TEXT PRIMARY KEY, name TEXT NOT NULL, location_id TEXT NOT NULL REFERENCES locations (id),
+        open_hour INTEGER, close_hour INTEGER, closed_weekdays TEXT, active INTEGER NOT NULL DEFAULT 1
+    )''')
+    conn.execute(
+        "INSERT INTO locations (id, name, timezone, open_hour, close_hour, closed_weekdays) VALUES (?, ?, ?, ?, ?, ?) "
+        "ON CONFLICT (id) DO NOTHING",
+        ("covina", "Covina, CA", "America/Los_Angeles", 12, 20, "6")
+    )
+    conn.execute("INSERT INTO artists (id, name, location_id) VALUES (?, ?, ?) ON CONFLICT (id) DO NOTHING",
+                 ("julio", "Julio", "covina"))
+    conn.execute("ALTER TABLE bookings ADD COLUMN artist_id TEXT")
+    conn.execute("UPDATE bookings SET artist_id = 'julio'")
+    # Availability and conflict checks seek on one artist's rows only
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_bookings_artist_span "
+                 "ON bookings (artist_id, deposit_paid, start_ts, end_ts)")
+    # Digests are now claimed per location: '<location_id>:<day>'
+    conn.execute("UPDATE reminder_digests SET day = 'covina:' || day")
+    if dialect(conn) == "postgres":
+        # Overlap is only a conflict within one artist's chair; = on text in a gist index needs btree_gist
+        conn.execute("CREATE EXTENSION IF NOT EXISTS btree_gist")
+        conn.execute("ALTER TABLE bookings DROP CONSTRAINT IF EXISTS bookings_paid_no_overlap")
+        conn.execute("ALTER TABLE bookings ADD CONSTRAINT bookings_paid_no_overlap EXCLUDE USING gist "
+                     "(artist_id WITH =, int8range(start_ts, end_ts) WITH &&) WHERE (deposit_paid = 1)")
+    # Aggregates are now local to each booking's location, on the 48-slot clock grid
+    rows = conn.execute(
+        "SELECT b.created_at, b.deposit_paid, b.confirmed_ts, b.start_ts, b.end_ts, l.timezone FROM bookings AS b "
+        "JOIN artists AS a ON a.id = b.artist_id JOIN locations AS l ON l.id = a.location_id"
+    ).fetchall()
+    _backfill_analytics(conn, rows, 15000, 0, 48)
+
+
+def _add_stripe_session_index(conn):
+    # The success page and reconcile.py look bookings up by Checkout Session id
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_bookings_stripe_session ON bookings (stripe_session_id)")
+
+
+def _add_stripe_event_retries(conn):
+    # A failing event backs off and is dead-lettered after MAX_ATTEMPTS, like outbox and calendar_jobs,
+    # instead of being retried at the head of the queue on every pass
+    conn.execute("ALTER TABLE stripe_events ADD COLUMN status TEXT DEFAULT 'pending'")
+    conn.execute("ALTER TABLE stripe_events ADD COLUMN attempts INTEGER DEFAULT 0")
+    conn.execute("ALTER TABLE stripe_events ADD COLUMN next_attempt_ts INTEGER")
+    conn.execute("ALTER TABLE stripe_events ADD COLUMN last_error TEXT")
+    conn.execute("UPDATE stripe_events SET status = 'done' WHERE processed_at IS NOT NULL")
+    conn.execute("UPDATE stripe_events SET next_attempt_ts = received_ts WHERE processed_at IS NULL")
+    conn.execute("DROP INDEX IF EXISTS idx_stripe_events_pending")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_stripe_events_due ON stripe_events (status, next_attempt_ts)")
+
+
+EPOCH_COLUMNS = {
+    "bookings": ("start_ts", "end_ts", "hold_expires_ts", "confirmed_ts", "reminder_sent_ts"),
+    "outbox": ("next_attempt_ts",),
+    "calendar_jobs": ("start_ts", "end_ts", "next_attempt_ts"),
+    "stripe_events": ("received_ts", "next_attempt_ts"),
+}
+
+
+def _widen_epoch_columns(conn):
+    # Postgres only: INTEGER is int4 there and overflows in 2038 (SQLite integers are already 64-bit).
+    # One ALTER per table, so each is rewritten once; the exclusion constraint and indexes are rebuilt with it.
+    if dialect(conn) != "postgres":
+        return
+    for table, columns in EPOCH_COLUMNS.items():
+        conn.execute(f"ALTER TABLE {table} " + ", ".join(f"ALTER COLUMN {column} TYPE BIGINT" for column in columns))
+
+
+MIGRATIONS = [
+    (1, "create bookings", _create_bookings),
+    (2, "epoch span columns + paid/span index", _add_epoch_span),
+    (3, "hold expiry", _add_hold_expiry),
+    (4, "email outbox", _create_outbox),
+    (5, "content-addressed attachments", _create_attachments),
+    (6, "calendar sync queue", _create_calendar_jobs),
+    (7, "stripe event ledger", _create_stripe_events),
+    (8, "stripe event payloads for deferred dispatch", _add_stripe_event_payload),
+    (9, "phase latency metrics", _create_phase_metrics),
+    (10, "confirmation time for the ICS feed", _add_confirmed_ts),
+    (11, "appointment reminders and daily digest", _add_reminders),
+    (12, "paid-overlap exclusion constraint (Postgres)", _add_overlap_exclusion),
+    (13, "daily and per-slot analytics aggregates", _create_analytics),
+    (14, "artists and locations with per-artist schedules", _add_artists),
+    (15, "stripe session lookup index", _add_stripe_session_index),
+    (16, "stripe event retry backoff and dead-letter state", _add_stripe_event_retries),
+    (17, "bigint epoch columns (Postgres)", _widen_epoch_columns),
+]
+
+
+def schema_version(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INTEGER PRIMARY KEY, name TEXT, applied_at TEXT
+    )''')
+    return conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_migrations").fetchone()[0]
+
+
+def migrate(conn):
+    # The write lock keeps app.py and webhook.py from migrating concurrently. The version check runs under it
+    # too: on Postgres, concurrent CREATE TABLE IF NOT EXISTS of schema_migrations can collide.
+    with transaction(conn):
+        lock(conn, MIGRATION_LOCK_KEY)
+        current = schema_version(conn)
+        if current >= MIGRATIONS[-1][0]:
+            return
+        for version, name, apply in MIGRATIONS:
+            if version <= current:
+                continue
+            apply(conn)
+            conn.execute(
+                "INSERT INTO schema_migrations (version, name, applied_at) VALUES (?, ?, ?)",
+                (version, name, datetime.utcnow().isoformat())
+            )
@@ -0,0 +1,117 @@
+# db_postgres.py — Postgres backend for db.py: pooled connections behind the sqlite3 calls the app makes
+# Selected by a postgres:// DATABASE_URL; needs the packages in requirements-postgres.txt.
+import os
+import threading
+from functools import lru_cache
+from psycopg_pool import ConnectionPool
+
+POOL_MIN_SIZE = int(os.environ.get("DB_POOL_MIN_SIZE", 1))
+POOL_MAX_SIZE = int(os.environ.get("DB_POOL_MAX_SIZE", 10))
+POOL_TIMEOUT_SECONDS = 10
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(url):
+    # One pool per process and database; gunicorn workers each open their own after forking
+    with _pools_lock:
+        if url not in _pools:
+            _pools[url] = ConnectionPool(
+                url, min_size=POOL_MIN_SIZE, max_size=POOL_MAX_SIZE, timeout=POOL_TIMEOUT_SECONDS,
+                kwargs={"autocommit": True}, open=True
+            )
+        return _pools[url]
+
+
+@lru_cache(maxsize=512)
+def translate(sql):
+    # The app writes sqlite3's qmark placeholders; psycopg wants %s (and a literal % doubled)
+    return sql.replace("%", "%%").replace("?", "%s")
+
+
+class Result:
+    # Rows are fetched before the connection goes back to the pool
+    def __init__(self, cursor):
+        self.rowcount = cursor.rowcount
+        self._rows = cursor.fetchall() if cursor.description else []
+        self._next = 0
+
+    def fetchone(self):
+        if self._next >= len(self._rows):
+            return None
+        self._next += 1
+        return self._rows[self._next - 1]
+
+    def fetchall(self):
+        rows, self._next = self._rows[self._next:], len(self._rows)
+        return rows
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+
+class PgConnection:
+    # Same surface as the sqlite3.Connection that db.get_conn() hands out. Outside a transaction each
+    # statement borrows a pooled connection (autocommit); db.transaction() pins one until commit/rollback.
+    dialect = "postgres"
+
+    def __init__(self, url):
+        self.url = url
+        self.pool = get_pool(url)
+        self._tx = None
+
+    @property
+    def in_transaction(self):
+        return self._tx is not None
+
+    def _run(self, method, sql, params):
+        if self._tx is not None:
+            with self._tx.cursor() as cur:
+                getattr(cur, method)(translate(sql), params)
+                return Result(cur)
+        with self.pool.connection() as conn, conn.cursor() as cur:
+            getattr(cur, method)(translate(sql), params)
+            return Result(cur)
+
+    def execute(self, sql, params=()):
+        return self._run("execute", sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        seq_of_params = list(seq_of_params)
+        if not seq_of_params:
+            return None
+        return self._run("executemany", sql, seq_of_params)
+
+    def begin(self):
+        self._tx = self.pool.getconn()
+        self._tx.execute("BEGIN")
+
+    def _end(self, statement):
+        conn, self._tx = self._tx, None
+        try:
+            conn.execute(statement)
+        finally:
+            self.pool.putconn(conn)
+
+    def commit(self):
+        if self._tx is not None:
+            self._end("COMMIT")
+
+    def rollback(self):
+        if self._tx is not None:
+            self._end("ROLLBACK")
+
+    def close(self):
+        self.rollback()
+
+
+def connect(url):
+    return PgConnection(url)
+
+
+def close_pool(url):
+    with _pools_lock:
+        pool = _pools.pop(url, None)
+    if pool:
+        pool.close()
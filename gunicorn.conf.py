@@ -0,0 +1,20 @@
+# gunicorn.conf.py — production serving for webhook.py
+#   gunicorn -c gunicorn.conf.py webhook:app
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+worker_class = "gthread"
+threads = int(os.environ.get("WEB_THREADS", 4))
+timeout = 30
+keepalive = 5
+# No preload: each worker imports the app itself and opens its own database connections (or Postgres pool)
+preload_app = False
+accesslog = "-"
+
+
+def post_worker_init(worker):
+    # Dispatcher and calendar sync run in every worker; their claims are atomic, so they don't collide
+    from webhook import start_background_workers
+    start_background_workers()
@@ -0,0 +1,69 @@
+# holds.py — unpaid bookings hold their slot until the Stripe Checkout Session expires
+import os
+import shutil
+import threading
+import time
+import blobstore
+import db
+
+# Checkout Session lifetime. Stripe requires expires_at >= 30 min out at creation time;
+# the margin covers the gap between reserving the slot and creating the session.
+CHECKOUT_TTL_SECONDS = 35 * 60
+# Extra time so a payment completed right at expiry still finds its row
+HOLD_GRACE_SECONDS = 5 * 60
+# A hold that reached Checkout is reaped early only once Stripe has reported its session expired (expire()
+# zeroes hold_expires_ts). Otherwise the row outlives Stripe's webhook retries (3 days) and reconcile.py's
+# lookback, so a payment whose notifications were all missed still finds its booking.
+UNRESOLVED_SESSION_SECONDS = 4 * 24 * 3600
+REAP_BATCH_SIZE = 200
+
+
+def hold_expiry(now=None):
+    return int(now or time.time()) + CHECKOUT_TTL_SECONDS + HOLD_GRACE_SECONDS
+
+
+def expire(conn, bid):
+    # Checkout abandoned or expired on Stripe's side: let the next reaper pass collect it
+    with db.transaction(conn):
+        conn.execute("UPDATE bookings SET hold_expires_ts = 0 WHERE id = ? AND deposit_paid = 0", (bid,))
+
+
+def reap_expired(conn, upload_dir, now=None, batch_size=REAP_BATCH_SIZE):
+    now = int(now or time.time())
+    reaped = 0
+    while True:
+        # Served by idx_bookings_hold_expiry
+        with db.transaction(conn):
+            ids = [row[0] for row in conn.execute(
+                "SELECT id FROM bookings WHERE deposit_paid = 0 "
+                "AND (hold_expires_ts <= ? AND stripe_session_id IS NULL OR hold_expires_ts <= ?) LIMIT ?"
+                + db.skip_locked(conn),
+                (now, now - UNRESOLVED_SESSION_SECONDS, batch_size)
+            )]
+            for bid in ids:
+                blobstore.release_booking(conn, bid)
+            conn.executemany("DELETE FROM bookings WHERE id = ? AND deposit_paid = 0", [(bid,) for bid in ids])
+        for bid in ids:
+            # Pre-blob-store bookings kept their uploads in uploads/<id>/
+            shutil.rmtree(os.path.join(upload_dir, bid), ignore_errors=True)
+        reaped += len(ids)
+        if len(ids) < batch_size:
+            break
+    blobstore.collect_orphans(conn, upload_dir)
+    return reaped
+
+
+def start_reaper(upload_dir, interval=60, path=db.DB_PATH):
+    def run():
+        while True:
+            try:
+                reaped = reap_expired(db.get_conn(path), upload_dir)
+                if reaped:
+                    print(f"Reaped {reaped} expired holds")
+            except Exception as e:
+                print("Hold reaper failed:", e)
+            time.sleep(interval)
+
+    thread = threading.Thread(target=run, name="hold-reaper", daemon=True)
+    thread.start()
+    return thread
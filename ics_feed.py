@@ -0,0 +1,67 @@
+# ics_feed.py — confirmed appointments as an iCalendar subscription feed, rebuilt only from what changed
+import hashlib
+import threading
+import time
+from datetime import datetime
+import pytz
+from availability import MAX_BOOKING_SECONDS
+from calendar_sync import render_calendar, render_vevent
+
+FEED_HISTORY_DAYS = 30  # past appointments kept in the feed
+# A confirmation can commit this long after the confirmed_ts it was stamped with (concurrent writers on Postgres),
+# so each refresh looks back this far before the newest confirmation it has seen
+COMMIT_SKEW_SECONDS = 300
+
+_feed = {"day": None, "state": None, "events": {}, "body": None, "etag": None}
+_feed_lock = threading.Lock()
+
+
+def _paid_state(conn):
+    # Two probes of idx_bookings_confirmed (only confirmed rows carry confirmed_ts): the newest confirmation, and
+    # how many fall in the skew window before it, which changes when a late commit lands behind the newest
+    latest = conn.execute("SELECT COALESCE(MAX(confirmed_ts), 0) FROM bookings").fetchone()[0]
+    recent = conn.execute(
+        "SELECT COUNT(*) FROM bookings WHERE confirmed_ts >= ?", (latest - COMMIT_SKEW_SECONDS,)
+    ).fetchone()[0]
+    return latest, recent
+
+
+def _rows(conn, horizon, since=None):
+    query = "SELECT id, name, description, start_ts, end_ts, confirmed_ts FROM bookings "
+    if since is None:
+        # Served by idx_bookings_paid_span: an appointment ending after the horizon starts at most one booking
+        # length before it
+        return conn.execute(query + "WHERE deposit_paid = 1 AND start_ts > ? AND end_ts > ?",
+                            (horizon - MAX_BOOKING_SECONDS, horizon)).fetchall()
+    # Served by idx_bookings_confirmed; confirmed_ts is only ever set together with deposit_paid
+    return conn.execute(query + "WHERE confirmed_ts >= ? AND end_ts > ?", (since, horizon)).fetchall()
+
+
+def _add(events, rows):
+    for bid, name, desc, start_ts, end_ts, confirmed_ts in rows:
+        events[bid] = (start_ts, render_vevent(bid, name, desc, start_ts, end_ts, confirmed_ts))
+
+
+def feed(conn, now=None):
+    # Returns (body, etag, last_modified_ts). Unchanged bookings cost two index probes; new confirmations are
+    # rendered on their own. The first request of each UTC day rebuilds from the horizon, which also drops
+    # appointments that aged out and paid rows removed by hand.
+    now = now or time.time()
+    day = datetime.fromtimestamp(now, pytz.UTC).date()
+    horizon = int(now) - FEED_HISTORY_DAYS * 86400
+    state = _paid_state(conn)
+    with _feed_lock:
+        if _feed["day"] == day and state == _feed["state"]:
+            return _feed["body"], _feed["etag"], state[0]
+
+        if _feed["day"] == day:
+            # Re-rendering a row already in the feed just replaces its event
+            events = _feed["events"]
+            _add(events, _rows(conn, horizon, _feed["state"][0] - COMMIT_SKEW_SECONDS))
+        else:
+            events = {}
+            _add(events, _rows(conn, horizon))
+
+        body = render_calendar([vevent for _, vevent in sorted(events.values())])
+        _feed.update(day=day, state=state, events=events, body=body, etag=hashlib.sha1(body.encode()).hexdigest())
+        return body, _feed["etag"], state[0]
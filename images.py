@@ -0,0 +1,64 @@
+# images.py — size-capped variants of reference photos, built in a process pool off the request thread
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image, ImageOps
+
+WEB_MAX_PX = 1600
+THUMB_MAX_PX = 320
+JPEG_QUALITY = 82
+WEBP_QUALITY = 75
+IMAGE_EXTS = {".png", ".jpg", ".jpeg"}
+
+# HEIC decoding needs the optional pillow-heif plugin; without it HEIC files pass through untouched
+try:
+    from pillow_heif import register_heif_opener
+    register_heif_opener()
+    IMAGE_EXTS.add(".heic")
+except ImportError:
+    pass
+
+
+def variant_paths(path):
+    stem = os.path.splitext(path)[0]
+    return f"{stem}.web.jpg", f"{stem}.thumb.webp"
+
+
+def make_variants(path):
+    web_path, thumb_path = variant_paths(path)
+    with Image.open(path) as img:
+        img = ImageOps.exif_transpose(img).convert("RGB")
+        img.thumbnail((WEB_MAX_PX, WEB_MAX_PX))
+        img.save(web_path, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+        img.thumbnail((THUMB_MAX_PX, THUMB_MAX_PX))
+        img.save(thumb_path, "WEBP", quality=WEBP_QUALITY)
+    return web_path, thumb_path
+
+
+def email_attachment(path, filename):
+    # Compact variant when ingestion has produced one, otherwise the original upload
+    web_path = variant_paths(path)[0]
+    if os.path.exists(web_path):
+        return web_path, os.path.splitext(filename)[0] + ".jpg"
+    return path, filename
+
+
+def start_pool(max_workers=2):
+    # spawn, not fork: the Streamlit/Flask parent is multi-threaded
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def _log_failure(future):
+    if future.exception():
+        print("Image ingestion failed:", future.exception())
+
+
+def submit(pool, files):
+    # files: (path, original filename) pairs; blobs have no extension of their own
+    futures = []
+    for path, filename in files:
+        if os.path.splitext(filename)[1].lower() in IMAGE_EXTS and not os.path.exists(variant_paths(path)[0]):
+            future = pool.submit(make_variants, path)
+            future.add_done_callback(_log_failure)
+            futures.append(future)
+    return futures
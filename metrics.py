@@ -0,0 +1,113 @@
+# metrics.py — per-phase latency histograms, shared across processes through the database
+# Each process times phases in memory and periodically adds its counts to phase_metrics, so webhook.py's
+# /metrics reports the Streamlit app's phases too. p95 checkout latency, for example:
+#   histogram_quantile(0.95, sum by (le) (rate(cashin_phase_duration_seconds_bucket{phase="checkout_session"}[5m])))
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+import db
+
+# Upper bounds in seconds; the last bucket is +Inf
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+METRIC_NAME = "cashin_phase_duration_seconds"
+# METRICS_LOG=1 also prints one JSON line per timed phase
+LOG_PHASES = os.environ.get("METRICS_LOG") == "1"
+
+_pending = {}
+_pending_lock = threading.Lock()
+
+
+def _bucket(seconds):
+    for index, bound in enumerate(BUCKETS):
+        if seconds <= bound:
+            return index
+    return len(BUCKETS)
+
+
+def observe(phase, seconds, outcome="ok"):
+    with _pending_lock:
+        count, total, buckets = _pending.get((phase, outcome)) or (0, 0.0, [0] * (len(BUCKETS) + 1))
+        buckets[_bucket(seconds)] += 1
+        _pending[(phase, outcome)] = (count + 1, total + seconds, buckets)
+
+
+@contextmanager
+def timed(phase, **fields):
+    # Exceptions are recorded under outcome="error" and re-raised
+    outcome = "ok"
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        seconds = time.perf_counter() - started
+        observe(phase, seconds, outcome)
+        if LOG_PHASES:
+            print(json.dumps({"ts": datetime.utcnow().isoformat(), "phase": phase, "outcome": outcome,
+                              "ms": round(seconds * 1000, 2), **fields}, default=str))
+
+
+def flush(conn):
+    with _pending_lock:
+        pending = dict(_pending)
+        _pending.clear()
+    if not pending:
+        return 0
+    with db.transaction(conn):
+        # Bucket lists are merged in Python, so concurrent flushes from other processes must wait
+        db.lock(conn, db.METRICS_LOCK_KEY)
+        for (phase, outcome), (count, total, buckets) in pending.items():
+            row = conn.execute(
+                "SELECT buckets FROM phase_metrics WHERE phase = ? AND outcome = ?", (phase, outcome)
+            ).fetchone()
+            if row:
+                buckets = [a + b for a, b in zip(json.loads(row[0]), buckets)]
+            conn.execute(
+                "INSERT INTO phase_metrics (phase, outcome, count, sum_seconds, buckets) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (phase, outcome) DO UPDATE SET count = phase_metrics.count + excluded.count, "
+                "sum_seconds = phase_metrics.sum_seconds + excluded.sum_seconds, buckets = excluded.buckets",
+                (phase, outcome, count, total, json.dumps(buckets))
+            )
+    return len(pending)
+
+
+def _labels(phase, outcome, le=None):
+    labels = f'phase="{phase}",outcome="{outcome}"'
+    return labels + f',le="{le}"' if le is not None else labels
+
+
+def render(conn):
+    # Prometheus text exposition format 0.0.4
+    lines = [
+        f"# HELP {METRIC_NAME} Time spent in each booking / webhook phase.",
+        f"# TYPE {METRIC_NAME} histogram",
+    ]
+    for phase, outcome, count, total, buckets in conn.execute(
+        "SELECT phase, outcome, count, sum_seconds, buckets FROM phase_metrics ORDER BY phase, outcome"
+    ):
+        cumulative = 0
+        for bound, n in zip(BUCKETS + ("+Inf",), json.loads(buckets)):
+            cumulative += n
+            lines.append(f"{METRIC_NAME}_bucket{{{_labels(phase, outcome, bound)}}} {cumulative}")
+        lines.append(f"{METRIC_NAME}_sum{{{_labels(phase, outcome)}}} {total}")
+        lines.append(f"{METRIC_NAME}_count{{{_labels(phase, outcome)}}} {count}")
+    return "\n".join(lines) + "\n"
+
+
+def start_flusher(interval=10, path=db.DB_PATH):
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                flush(db.get_conn(path))
+            except Exception as e:
+                print("Metrics flush failed:", e)
+
+    thread = threading.Thread(target=run, name="metrics-flush", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,153 @@
+# outbox.py — durable email outbox drained by a background worker over one reused SMTP connection
+#   python outbox.py   (standalone worker; reads ICLOUD_EMAIL / ICLOUD_APP_PASSWORD from the environment)
+import json
+import os
+import smtplib
+import threading
+import time
+from datetime import datetime
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+from email.mime.base import MIMEBase
+from email import encoders
+import db
+import metrics
+
+SMTP_HOST = "smtp.mail.me.com"
+SMTP_PORT = 587
+MAX_ATTEMPTS = 6
+# A claimed message is retried by any worker if not finished within the lease
+LEASE_SECONDS = 300
+SENDS_PER_MINUTE = 20
+IDLE_CLOSE_SECONDS = 120
+
+
+def enqueue(conn, to_addr, subject, body, attachments=()):
+    with db.transaction(conn):
+        conn.execute(
+            "INSERT INTO outbox (to_addr, subject, body, attachments, status, attempts, next_attempt_ts, created_at) "
+            "VALUES (?, ?, ?, ?, 'pending', 0, ?, ?)",
+            (to_addr, subject, body, json.dumps(list(attachments)), int(time.time()), datetime.utcnow().isoformat())
+        )
+
+
+def build_message(sender, to_addr, subject, body, attachments):
+    msg = MIMEMultipart()
+    msg['From'] = sender
+    msg['To'] = to_addr
+    msg['Subject'] = subject
+    msg.attach(MIMEText(body, 'plain'))
+
+    # Each attachment is a path or a [path, filename] pair
+    for item in attachments:
+        file_path, filename = (item, os.path.basename(item)) if isinstance(item, str) else item
+        if file_path and os.path.exists(file_path):
+            with open(file_path, "rb") as attachment:
+                part = MIMEBase('application', 'octet-stream')
+                part.set_payload(attachment.read())
+                encoders.encode_base64(part)
+                part.add_header('Content-Disposition', 'attachment', filename=filename)
+                msg.attach(part)
+    return msg
+
+
+class SMTPConnection:
+    # Opens lazily, stays open between sends and reconnects once if the server dropped it
+    def __init__(self, user, password, host=SMTP_HOST, port=SMTP_PORT, starttls=True):
+        self.user, self.password = user, password
+        self.host, self.port, self.starttls = host, port, starttls
+        self.server = None
+        self.last_used = 0
+
+    def _connect(self):
+        self.server = smtplib.SMTP(self.host, self.port, timeout=30)
+        if self.starttls:
+            self.server.starttls()
+        if self.password:
+            self.server.login(self.user, self.password)
+
+    def send(self, to_addr, msg):
+        for attempt in range(2):
+            if self.server is None:
+                self._connect()
+            try:
+                self.server.sendmail(self.user, to_addr, msg.as_string())
+                self.last_used = time.monotonic()
+                return
+            except smtplib.SMTPServerDisconnected:
+                self.server = None
+                if attempt:
+                    raise
+
+    def close_if_idle(self, idle_seconds=IDLE_CLOSE_SECONDS):
+        if self.server is not None and time.monotonic() - self.last_used > idle_seconds:
+            self.close()
+
+    def close(self):
+        if self.server is not None:
+            try:
+                self.server.quit()
+            except smtplib.SMTPException:
+                pass
+            self.server = None
+
+
+class RateLimiter:
+    def __init__(self, per_minute=SENDS_PER_MINUTE):
+        self.interval = 60.0 / per_minute
+        self.next_at = 0.0
+
+    def wait(self):
+        now = time.monotonic()
+        if now < self.next_at:
+            time.sleep(self.next_at - now)
+        self.next_at = max(now, self.next_at) + self.interval
+
+
+def claim_due(conn, limit, now=None):
+    return db.claim_due(conn, "outbox", ("to_addr", "subject", "body", "attachments"), limit, LEASE_SECONDS, now=now)
+
+
+def process_due(conn, smtp, limiter, batch_size=20, now=None):
+    sent = 0
+    for mid, to_addr, subject, body, attachments, attempts in claim_due(conn, batch_size, now):
+        try:
+            limiter.wait()
+            with metrics.timed("smtp_send", email_id=mid):
+                smtp.send(to_addr, build_message(smtp.user, to_addr, subject, body, json.loads(attachments or "[]")))
+        except Exception as e:
+            smtp.close()
+            db.retry_later(conn, "outbox", [(mid, attempts, e)], MAX_ATTEMPTS)
+            print(f"Email {mid} to {to_addr} failed (attempt {attempts}):", e)
+            continue
+        with db.transaction(conn):
+            conn.execute(
+                "UPDATE outbox SET status = 'sent', sent_at = ?, last_error = NULL WHERE id = ?",
+                (datetime.utcnow().isoformat(), mid)
+            )
+        sent += 1
+    return sent
+
+
+def start_worker(user, password, interval=5, path=db.DB_PATH, smtp=None):
+    smtp = smtp or SMTPConnection(user, password)
+    limiter = RateLimiter()
+
+    def run():
+        while True:
+            try:
+                if not process_due(db.get_conn(path), smtp, limiter):
+                    smtp.close_if_idle()
+                    time.sleep(interval)
+            except Exception as e:
+                print("Outbox worker failed:", e)
+                time.sleep(interval)
+
+    thread = threading.Thread(target=run, name="email-outbox", daemon=True)
+    thread.start()
+    return thread
+
+
+if __name__ == "__main__":
+    metrics.start_flusher()
+    start_worker(os.environ["ICLOUD_EMAIL"], os.environ["ICLOUD_APP_PASSWORD"]).join()
@@ -0,0 +1,95 @@
+# pages/analytics.py — admin view of utilization, hold → paid conversion and deposit revenue
+# Reads only the daily_stats / slot_stats aggregates (see analytics.py), never the bookings table.
+import streamlit as st
+from datetime import datetime, timedelta
+import hmac
+import pandas as pd
+import analytics
+import db
+import schedules
+
+st.set_page_config(page_title="Cashin Ink — Analytics", layout="wide", page_icon="📊")
+
+# ==================== ACCESS ====================
+ADMIN_PASSWORD = st.secrets.get("ADMIN_PASSWORD")
+if not ADMIN_PASSWORD:
+    st.error("Set ADMIN_PASSWORD in secrets to enable the analytics page.")
+    st.stop()
+if not st.session_state.get("admin_ok"):
+    password = st.text_input("Admin password", type="password")
+    if not password:
+        st.stop()
+    if not hmac.compare_digest(password.encode(), ADMIN_PASSWORD.encode()):
+        st.error("Wrong password")
+        st.stop()
+    st.session_state.admin_ok = True
+
+WEEKDAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def load_daily(first_day, last_day):
+    frame = pd.DataFrame(
+        analytics.daily(db.get_conn(), first_day, last_day),
+        columns=["day", "holds", "paid", "paid_seconds", "deposit_cents"]
+    )
+    frame["day"] = pd.to_datetime(frame["day"])
+    return frame
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def load_slots():
+    return pd.DataFrame(analytics.by_slot(db.get_conn()), columns=["weekday", "slot", "paid_seconds"])
+
+
+st.title("📊 Studio Analytics")
+weeks = st.slider("Weeks of history", min_value=4, max_value=104, value=26, step=1)
+today = datetime.now(schedules.get(db.get_conn(), schedules.DEFAULT_ARTIST_ID).tz).date()
+first_day = today - timedelta(days=today.weekday(), weeks=weeks - 1)
+daily = load_daily(first_day, today)
+
+# ==================== REVENUE & CONVERSION BY WEEK ====================
+weekly = (
+    daily.set_index("day")
+    .resample("W-MON", label="left", closed="left")[["holds", "paid", "paid_seconds", "deposit_cents"]]
+    .sum()
+)
+weekly["revenue"] = weekly["deposit_cents"] / 100
+weekly["booked_hours"] = weekly["paid_seconds"] / 3600
+weekly["conversion"] = (weekly["paid"] / weekly["holds"].where(weekly["holds"] > 0)).fillna(0)
+weekly.index = weekly.index.strftime("%Y-%m-%d")
+
+total_holds, total_paid = int(daily["holds"].sum()), int(daily["paid"].sum())
+col1, col2, col3, col4 = st.columns(4)
+col1.metric("Deposit revenue", f"${daily['deposit_cents'].sum() / 100:,.0f}")
+col2.metric("Paid bookings", total_paid)
+col3.metric("Hold → paid", f"{total_paid / total_holds:.0%}" if total_holds else "—")
+col4.metric("Booked hours", f"{daily['paid_seconds'].sum() / 3600:,.1f}")
+
+st.subheader("Deposit revenue by week ($)")
+st.bar_chart(weekly["revenue"])
+
+st.subheader("Hold → paid conversion by week")
+st.line_chart(weekly[["conversion"]])
+st.dataframe(
+    weekly[["holds", "paid", "conversion", "booked_hours", "revenue"]].rename_axis("week of"),
+    use_container_width=True,
+    column_config={"conversion": st.column_config.NumberColumn(format="%.2f")}
+)
+
+# ==================== UTILIZATION BY WEEKDAY & SLOT ====================
+st.subheader("Booked hours by weekday and slot (all time, local to each location)")
+by_slot = load_slots()
+grid = (
+    by_slot.assign(hours=by_slot["paid_seconds"] / 3600)
+    .pivot_table(index="slot", columns="weekday", values="hours", aggfunc="sum", fill_value=0)
+    .reindex(index=range(analytics.SLOTS_PER_CLOCK_DAY), columns=range(7), fill_value=0)
+)
+# Trim the clock to the earliest and latest slot anyone has worked
+worked = grid.index[grid.sum(axis=1) > 0]
+if len(worked):
+    grid = grid.loc[worked.min():worked.max()]
+grid.index = [analytics.clock_slot_time(i).strftime("%-I:%M %p") for i in grid.index]
+grid.columns = WEEKDAYS
+st.dataframe(grid.round(1), use_container_width=True)
+st.bar_chart(grid.sum().rename("hours"))
@@ -0,0 +1,136 @@
+# reconcile.py — confirms bookings whose deposit was paid but never recorded (success page and webhook both missed)
+#   python reconcile.py [--hours 48] [--dry-run] [--api-base http://localhost:12111]   (reads STRIPE_SECRET_KEY)
+# Pages through recent completed Checkout Sessions, 100 per request, instead of retrieving one session per
+# booking; thousands of pending rows cost a few dozen calls. Run it from cron, e.g. every 15 minutes.
+import argparse
+import os
+import time
+import stripe
+import checkout
+import db
+import metrics
+import webhook_events
+from availability import MAX_BOOKING_SECONDS
+from db import parse_utc, to_epoch
+
+PAGE_SIZE = 100  # Stripe's maximum for list endpoints
+LOOKBACK_HOURS = 48
+MATCH_CHUNK = 500  # session ids per IN (...) lookup
+
+
+def oldest_pending(conn):
+    # Creation time of the oldest unpaid booking; no sessions older than it can matter. Rows whose session id
+    # was never stored count too: their sessions are found by metadata.
+    row = conn.execute("SELECT MIN(created_at) FROM bookings WHERE deposit_paid = 0").fetchone()
+    return to_epoch(parse_utc(row[0])) if row and row[0] else None
+
+
+def paid_sessions(since_ts, page_size=PAGE_SIZE):
+    # Returns ({session_id: booking_id from metadata}, api_calls)
+    paid, calls = {}, 0
+    page = checkout.with_retries(lambda: stripe.checkout.Session.list(
+        created={"gte": since_ts}, status="complete", limit=page_size
+    ))
+    while True:
+        calls += 1
+        for session in page.data:
+            if session.payment_status == "paid":
+                paid[session.id] = (session.metadata or {}).get("booking_id")
+        if not page.has_more or not page.data:
+            return paid, calls
+        page = checkout.with_retries(page.next_page)
+
+
+def _lookup(conn, column, keys):
+    # {column value: (booking_id, deposit_paid)}, each chunk one indexed IN (...) lookup
+    keys = list(keys)
+    found = {}
+    for i in range(0, len(keys), MATCH_CHUNK):
+        chunk = keys[i:i + MATCH_CHUNK]
+        rows = conn.execute(
+            f"SELECT {column}, id, deposit_paid FROM bookings WHERE {column} IN ({', '.join('?' * len(chunk))})",
+            chunk
+        ).fetchall()
+        found.update({key: (bid, deposit_paid) for key, bid, deposit_paid in rows})
+    return found
+
+
+def match(conn, paid):
+    # {session_id: (booking_id, deposit_paid)}: by the stored session id (idx_bookings_stripe_session), then, for
+    # a session never linked to its row (the page died between create and attach), by its metadata booking_id
+    matched = _lookup(conn, "stripe_session_id", paid)
+    unlinked = {sid: bid for sid, bid in paid.items() if sid not in matched and bid}
+    by_id = _lookup(conn, "id", set(unlinked.values()))
+    matched.update({sid: by_id[bid] for sid, bid in unlinked.items() if bid in by_id})
+    return matched
+
+
+def slot_taken_by(conn, bid):
+    # Another paid booking of the same artist overlapping this one, if any
+    row = conn.execute(
+        "SELECT other.id FROM bookings AS b JOIN bookings AS other ON other.artist_id = b.artist_id "
+        "AND other.deposit_paid = 1 AND other.id <> b.id AND other.start_ts > b.start_ts - ? "
+        "AND other.start_ts < b.end_ts AND other.end_ts > b.start_ts "
+        "WHERE b.id = ? LIMIT 1",
+        (MAX_BOOKING_SECONDS, bid)
+    ).fetchone()
+    return row[0] if row else None
+
+
+def reconcile(conn, lookback_hours=LOOKBACK_HOURS, dry_run=False, now=None):
+    now = int(now or time.time())
+    stats = {"api_calls": 0, "paid_sessions": 0, "confirmed": 0, "conflicts": [], "missing": []}
+    oldest = oldest_pending(conn)
+    if oldest is None:
+        return stats
+    with metrics.timed("reconcile"):
+        paid, stats["api_calls"] = paid_sessions(max(oldest, now - lookback_hours * 3600))
+        stats["paid_sessions"] = len(paid)
+        matched = match(conn, paid)
+        # Paid on Stripe but no row to confirm (reaped, or no booking_id in its metadata): needs a human
+        stats["missing"] = [(sid, bid) for sid, bid in paid.items() if sid not in matched]
+        pending = {bid: sid for sid, (bid, deposit_paid) in matched.items() if not deposit_paid}
+        if dry_run:
+            stats["confirmed"] = len(pending)
+            return stats
+        for bid, sid in pending.items():
+            with db.transaction(conn):
+                if webhook_events.confirm_paid(conn, bid):
+                    stats["confirmed"] += 1
+                    continue
+                # Not confirmed here. The webhook or success page may have confirmed it since match(), which is
+                # fine; only a row still unpaid behind another paid booking needs a refund.
+                row = conn.execute("SELECT deposit_paid FROM bookings WHERE id = ?", (bid,)).fetchone()
+                if row is None:
+                    stats["missing"].append((sid, bid))
+                elif not row[0]:
+                    taken_by = slot_taken_by(conn, bid)
+                    if taken_by:
+                        stats["conflicts"].append((bid, taken_by))
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--hours", type=int, default=LOOKBACK_HOURS, help="how far back to list sessions")
+    parser.add_argument("--dry-run", action="store_true", help="report what would be confirmed")
+    parser.add_argument("--api-base", help="Stripe API base URL, e.g. a local stripe-mock")
+    args = parser.parse_args()
+
+    checkout.configure(os.environ["STRIPE_SECRET_KEY"])
+    if args.api_base:
+        stripe.api_base = args.api_base
+    conn = db.get_conn()
+    stats = reconcile(conn, args.hours, args.dry_run)
+    metrics.flush(conn)
+
+    verb = "would confirm" if args.dry_run else "confirmed"
+    print(f"{stats['paid_sessions']} paid session(s) in {stats['api_calls']} API call(s); {verb} {stats['confirmed']}")
+    for bid, taken_by in stats["conflicts"]:
+        print(f"Booking {bid}: paid, but paid booking {taken_by} already has its slot — refund needed")
+    for session_id, bid in stats["missing"]:
+        print(f"Session {session_id} (booking {bid or '?'}): paid, but no booking row matches it")
+
+
+if __name__ == "__main__":
+    main()
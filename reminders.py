@@ -0,0 +1,128 @@
+# reminders.py — appointment reminders and each location's next-day digest, queued through the email outbox
+import threading
+import time
+from datetime import datetime, timedelta
+import db
+import outbox
+import schedules
+from availability import window_bounds
+
+REMINDER_LEAD_HOURS = 24
+BATCH_SIZE = 200
+DIGEST_HOUR = 18  # location-local hour after which tomorrow's digest goes out
+
+
+def due_reminders(conn, now, lead_hours=REMINDER_LEAD_HOURS, limit=BATCH_SIZE):
+    # Served by idx_bookings_reminder_due: one range over start_ts among paid, unreminded rows
+    return conn.execute(
+        "SELECT id, name, email, date, time, artist_id FROM bookings "
+        "WHERE deposit_paid = 1 AND reminder_sent_ts IS NULL AND start_ts > ? AND start_ts <= ? "
+        "ORDER BY start_ts LIMIT ?" + db.skip_locked(conn),
+        (now, now + lead_hours * 3600, limit)
+    ).fetchall()
+
+
+def reminder_body(name, appt_date, appt_time, schedule):
+    return f"""
+Hi {name}!
+
+Just a reminder that your tattoo appointment with {schedule.artist_name} at Cashin Ink is coming up.
+
+📅 Date: {appt_date}
+🕒 Time: {appt_time}
+
+Please eat beforehand, stay hydrated, and bring a photo ID.
+
+See you soon!
+
+— Cashin Ink Team
+{schedule.location_name}
+    """
+
+
+def queue_reminders(conn, now=None, lead_hours=REMINDER_LEAD_HOURS, batch_size=BATCH_SIZE):
+    # The outbox insert and the sent marker commit together, so a booking is handed off exactly once;
+    # delivery, batching over one SMTP session and rate limiting are the outbox worker's job
+    now = int(now or time.time())
+    queued = 0
+    artists = {}
+    while True:
+        with db.transaction(conn):
+            rows = due_reminders(conn, now, lead_hours, batch_size)
+            for bid, name, email, appt_date, appt_time, artist_id in rows:
+                if artist_id not in artists:
+                    artists[artist_id] = schedules.get(conn, artist_id)
+                if email:
+                    outbox.enqueue(conn, email, "Cashin Ink — Appointment Reminder",
+                                   reminder_body(name, appt_date, appt_time, artists[artist_id]))
+            conn.executemany("UPDATE bookings SET reminder_sent_ts = ? WHERE id = ?", [(now, row[0]) for row in rows])
+        queued += len(rows)
+        if len(rows) < batch_size:
+            return queued
+
+
+def digest_body(day, location_name, rows, studio_tz):
+    lines = [f"{location_name} — schedule for {day.strftime('%A, %b %-d')} — {len(rows)} appointment(s)"]
+    artist = None
+    for artist_name, name, phone, email, description, start_ts, end_ts in rows:
+        if artist_name != artist:
+            artist = artist_name
+            lines += ["", f"{artist}:"]
+        start = datetime.fromtimestamp(start_ts, studio_tz).strftime("%-I:%M %p")
+        end = datetime.fromtimestamp(end_ts, studio_tz).strftime("%-I:%M %p")
+        lines.append(f"{start} – {end}  {name}  {phone or ''}  {email or ''}")
+        if description:
+            lines.append(f"    {description.strip()}")
+    return "\n".join(lines)
+
+
+def queue_digest(conn, studio_email, location_id, location_name, studio_tz, now=None):
+    # Once per location-local day, after DIGEST_HOUR: tomorrow's paid appointments at that location,
+    # one indexed range per artist
+    local_now = datetime.fromtimestamp(now or time.time(), studio_tz)
+    if local_now.hour < DIGEST_HOUR:
+        return False
+    day = local_now.date() + timedelta(days=1)
+    day_start, day_end = window_bounds(day, day, studio_tz)
+    with db.transaction(conn):
+        claimed = conn.execute(
+            "INSERT INTO reminder_digests (day, sent_at) VALUES (?, ?) ON CONFLICT (day) DO NOTHING",
+            (f"{location_id}:{day}", datetime.utcnow().isoformat())
+        ).rowcount
+        if not claimed:
+            return False
+        rows = conn.execute(
+            "SELECT a.name, b.name, b.phone, b.email, b.description, b.start_ts, b.end_ts "
+            "FROM artists AS a JOIN bookings AS b ON b.artist_id = a.id "
+            "WHERE a.location_id = ? AND b.deposit_paid = 1 AND b.start_ts >= ? AND b.start_ts < ? "
+            "ORDER BY a.name, b.start_ts",
+            (location_id, day_start, day_end)
+        ).fetchall()
+        outbox.enqueue(conn, studio_email, f"Cashin Ink {location_name} — Tomorrow's schedule ({len(rows)})",
+                       digest_body(day, location_name, rows, studio_tz))
+    return True
+
+
+def queue_digests(conn, studio_email, now=None):
+    # One digest per location with an active artist
+    locations = {schedule.location_id: schedule for schedule in schedules.artists(conn)}
+    return sum(queue_digest(conn, studio_email, location_id, schedule.location_name, schedule.tz, now)
+               for location_id, schedule in sorted(locations.items()))
+
+
+def start_scheduler(studio_email, interval=300, path=db.DB_PATH):
+    def run():
+        while True:
+            try:
+                conn = db.get_conn(path)
+                queued = queue_reminders(conn)
+                if queued:
+                    print(f"Queued {queued} appointment reminder(s)")
+                queue_digests(conn, studio_email)
+            except Exception as e:
+                print("Reminder scheduler failed:", e)
+            time.sleep(interval)
+
+    thread = threading.Thread(target=run, name="reminders", daemon=True)
+    thread.start()
+    return thread
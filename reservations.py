@@ -0,0 +1,84 @@
+# reservations.py — atomic slot reservation and deposit confirmation
+import time
+from datetime import datetime
+import pytz
+import db
+import analytics
+import holds
+import metrics
+import schedules
+from availability import find_conflict, MAX_BOOKING_SECONDS
+
+DEPOSIT_CENTS = 15000
+
+
+class SlotTaken(Exception):
+    def __init__(self, booked_by):
+        super().__init__(f"slot overlaps an existing booking ({booked_by})")
+        self.booked_by = booked_by
+
+
+def reserve(conn, bid, name, age, phone, email, description, date, time_label, start_dt, end_dt, files="",
+            artist_id=schedules.DEFAULT_ARTIST_ID):
+    # Conflict check and insert share one write transaction, so two sessions
+    # can't both pass the check for the same artist and slot. A resubmit (double-click, rerun)
+    # by the same customer for the same slot returns the id of their live hold.
+    start_ts, end_ts = db.to_epoch(start_dt), db.to_epoch(end_dt)
+    with db.transaction(conn):
+        db.lock_span(conn, start_ts, end_ts, artist_id)
+        existing = conn.execute(
+            "SELECT id FROM bookings WHERE artist_id = ? AND deposit_paid = 0 AND start_ts = ? AND end_ts = ? "
+            "AND hold_expires_ts > ? AND lower(email) = lower(?)",
+            (artist_id, start_ts, end_ts, int(time.time()), email)
+        ).fetchone()
+        if existing:
+            return existing[0]
+        with metrics.timed("conflict_check", booking_id=bid):
+            conflict = find_conflict(conn, artist_id, start_ts, end_ts)
+        if conflict:
+            raise SlotTaken(conflict[0])
+        conn.execute("""INSERT INTO bookings
+                        (id, artist_id, name, age, phone, email, description, date, time, start_dt, end_dt,
+                         start_ts, end_ts, deposit_paid, hold_expires_ts, files, created_at)
+                        VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)""", (
+            bid, artist_id, name, age, phone, email, description, date, time_label,
+            start_dt.astimezone(pytz.UTC).isoformat(), end_dt.astimezone(pytz.UTC).isoformat(),
+            start_ts, end_ts, 0, holds.hold_expiry(), files, datetime.utcnow().isoformat()
+        ))
+        analytics.record_hold(conn, int(time.time()), schedules.get(conn, artist_id).tz)
+    return bid
+
+
+def attach_session(conn, bid, session_id):
+    with db.transaction(conn):
+        conn.execute("UPDATE bookings SET stripe_session_id = ? WHERE id = ?", (session_id, bid))
+
+
+def confirm(conn, bid):
+    # Single conditional UPDATE: flips an unpaid booking to paid unless a paid booking
+    # for the same artist already covers the slot. rowcount == 1 means this caller won.
+    confirmed_ts = int(time.time())
+    with db.transaction(conn):
+        if db.dialect(conn) == "postgres":
+            # Concurrent confirmations of overlapping holds queue on the span's locks instead of
+            # both passing NOT EXISTS (the exclusion constraint would reject the loser's UPDATE)
+            span = conn.execute("SELECT start_ts, end_ts, artist_id FROM bookings WHERE id = ?", (bid,)).fetchone()
+            if span:
+                db.lock_span(conn, *span)
+        cur = conn.execute("""
+            UPDATE bookings SET deposit_paid = 1, hold_expires_ts = NULL, confirmed_ts = ?
+            WHERE id = ? AND deposit_paid = 0
+            AND NOT EXISTS (
+                SELECT 1 FROM bookings AS other
+                WHERE other.artist_id = bookings.artist_id AND other.deposit_paid = 1
+                AND other.start_ts > bookings.start_ts - ? AND other.start_ts < bookings.end_ts
+                AND other.end_ts > bookings.start_ts
+            )
+        """, (confirmed_ts, bid, MAX_BOOKING_SECONDS))
+        if cur.rowcount != 1:
+            return False
+        start_ts, end_ts, artist_id = conn.execute(
+            "SELECT start_ts, end_ts, artist_id FROM bookings WHERE id = ?", (bid,)
+        ).fetchone()
+        analytics.record_paid(conn, confirmed_ts, start_ts, end_ts, DEPOSIT_CENTS, schedules.get(conn, artist_id).tz)
+    return True
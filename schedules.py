@@ -0,0 +1,52 @@
+# schedules.py — studio locations and the artists (chairs) who work them, each with hours, closed days and timezone
+# A location sets the timezone and default hours; an artist's own open_hour / close_hour / closed_weekdays
+# override them when set. Adding a chair or a second studio is two rows, e.g.:
+#   INSERT INTO locations (id, name, timezone, open_hour, close_hour, closed_weekdays)
+#       VALUES ('austin', 'Austin, TX', 'America/Chicago', 11, 19, '5,6');
+#   INSERT INTO artists (id, name, location_id, close_hour) VALUES ('maya', 'Maya', 'austin', 21);
+from collections import namedtuple
+import pytz
+
+DEFAULT_LOCATION_ID = "covina"
+DEFAULT_ARTIST_ID = "julio"
+WEEKDAY_NAMES = ["Mondays", "Tuesdays", "Wednesdays", "Thursdays", "Fridays", "Saturdays", "Sundays"]
+
+Schedule = namedtuple("Schedule", "artist_id artist_name location_id location_name tz open_hour close_hour closed_weekdays")
+
+_SELECT = (
+    "SELECT a.id, a.name, l.id, l.name, l.timezone, COALESCE(a.open_hour, l.open_hour), "
+    "COALESCE(a.close_hour, l.close_hour), COALESCE(a.closed_weekdays, l.closed_weekdays) "
+    "FROM artists AS a JOIN locations AS l ON l.id = a.location_id"
+)
+
+
+def parse_weekdays(value):
+    # closed_weekdays is a comma-separated list of Python weekdays (Monday = 0)
+    return frozenset(int(day) for day in (value or "").split(",") if day.strip())
+
+
+def _schedule(row):
+    artist_id, artist_name, location_id, location_name, tz, open_hour, close_hour, closed = row
+    return Schedule(artist_id, artist_name, location_id, location_name, pytz.timezone(tz),
+                    open_hour, close_hour, parse_weekdays(closed))
+
+
+def artists(conn):
+    return [_schedule(row) for row in conn.execute(_SELECT + " WHERE a.active = 1 ORDER BY l.name, a.name")]
+
+
+def get(conn, artist_id):
+    row = conn.execute(_SELECT + " WHERE a.id = ?", (artist_id,)).fetchone()
+    return _schedule(row) if row else None
+
+
+def _hour_label(hour):
+    return f"{hour % 12 or 12} {'AM' if hour % 24 < 12 else 'PM'}"
+
+
+def hours_label(schedule):
+    # "12 PM – 8 PM (closed Sundays)"
+    label = f"{_hour_label(schedule.open_hour)} – {_hour_label(schedule.close_hour)}"
+    if schedule.closed_weekdays:
+        label += f" (closed {', '.join(WEEKDAY_NAMES[day] for day in sorted(schedule.closed_weekdays))})"
+    return label
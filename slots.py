@@ -0,0 +1,71 @@
+# slots.py — per-day bitmaps of taken 30-minute slots, so the pickers only offer bookable times
+# Slot indexes count from the artist's opening time (see schedules.py), in their location's timezone.
+from datetime import datetime, time, timedelta
+from availability import blocking_rows, window_bounds
+
+SLOT_MINUTES = 30
+
+
+def slots_per_day(schedule):
+    return (schedule.close_hour - schedule.open_hour) * 60 // SLOT_MINUTES
+
+
+def full_day(schedule):
+    return (1 << slots_per_day(schedule)) - 1
+
+
+def slot_time(schedule, index):
+    # index 0 = opening time; index slots_per_day() = closing time (valid as an end time only)
+    minutes = schedule.open_hour * 60 + index * SLOT_MINUTES
+    return time(minutes // 60, minutes % 60)
+
+
+def slot_index(schedule, t):
+    return (t.hour * 60 + t.minute - schedule.open_hour * 60) // SLOT_MINUTES
+
+
+def day_masks(conn, schedule, first_day, last_day, now=None):
+    # One indexed range query over this artist's bookings for the whole window (paid bookings and live holds).
+    # Bit i of masks[day] is set when slot i on that local day is taken.
+    studio_tz, per_day = schedule.tz, slots_per_day(schedule)
+    window_start, window_end = window_bounds(first_day, last_day, studio_tz)
+    rows = blocking_rows(conn, schedule.artist_id, "start_ts, end_ts", window_start, window_end, now)
+
+    masks = {}
+    for start_ts, end_ts in rows:
+        start = datetime.fromtimestamp(start_ts, studio_tz)
+        end = datetime.fromtimestamp(end_ts, studio_tz)
+        day = start.date()
+        while day <= end.date():
+            opening = studio_tz.localize(datetime.combine(day, slot_time(schedule, 0)))
+            # Slots [first, last) overlapped by this booking on this day, clamped to opening hours
+            first = max(0, int((start - opening).total_seconds()) // (SLOT_MINUTES * 60))
+            last = min(per_day, -(-int((end - opening).total_seconds()) // (SLOT_MINUTES * 60)))
+            if first < last:
+                masks[day] = masks.get(day, 0) | (((1 << (last - first)) - 1) << first)
+            day += timedelta(days=1)
+    return masks
+
+
+def free_starts(schedule, mask):
+    return [i for i in range(slots_per_day(schedule)) if not mask >> i & 1]
+
+
+def valid_ends(schedule, mask, start):
+    # Ends run from start + 1 slot up to the next taken slot (or closing)
+    ends = []
+    for i in range(start, slots_per_day(schedule)):
+        if mask >> i & 1:
+            break
+        ends.append(i + 1)
+    return ends
+
+
+def bookable_days(schedule, masks, first_day, last_day):
+    days = []
+    day = first_day
+    while day <= last_day:
+        if day.weekday() not in schedule.closed_weekdays and masks.get(day, 0) != full_day(schedule):
+            days.append(day)
+        day += timedelta(days=1)
+    return days
@@ -0,0 +1,14 @@
+import os
+
+from streamlit.testing.v1 import AppTest
+
+PAGE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "pages", "analytics.py")
+
+
+def test_non_ascii_password_is_rejected_not_crashed():
+    page = AppTest.from_file(PAGE)
+    page.secrets["ADMIN_PASSWORD"] = "s3cret"
+    page.run()
+    page.text_input[0].input("pässword").run()
+    assert not page.exception
+    assert [e.value for e in page.error] == ["Wrong password"]
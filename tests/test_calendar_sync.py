@@ -0,0 +1,88 @@
+import time
+
+import pytest
+
+import calendar_sync
+
+
+class FakeCalendar:
+    # Saves events until `fail_after` saves have gone through
+    def __init__(self, fail_after=None):
+        self.events, self.fail_after = [], fail_after
+
+    def save_event(self, ics):
+        if self.fail_after is not None and len(self.events) >= self.fail_after:
+            raise ConnectionError("CalDAV server unreachable")
+        self.events.append(ics)
+
+
+@pytest.fixture
+def calendar(monkeypatch):
+    calendar = FakeCalendar()
+    monkeypatch.setattr(calendar_sync, "get_calendar", lambda: calendar)
+    return calendar
+
+
+def enqueue(conn, count):
+    for i in range(count):
+        calendar_sync.enqueue(conn, f"booking-{i}", f"Client {i}", "Rose", 1_900_000_000 + i * 7200, 1_900_003_600 + i * 7200)
+
+
+def jobs(conn):
+    return conn.execute(
+        "SELECT booking_id, status, attempts, next_attempt_ts, last_error FROM calendar_jobs ORDER BY id"
+    ).fetchall()
+
+
+def test_jobs_are_written_and_marked_done(conn, calendar):
+    enqueue(conn, 3)
+    assert calendar_sync.process_due(conn) == 3
+    assert [status for _, status, *_ in jobs(conn)] == ["done"] * 3
+    assert "UID:booking-0@cashin-ink" in calendar.events[0]
+    assert calendar_sync.process_due(conn) == 0
+
+
+def test_failure_backs_off_the_rest_of_the_batch(conn, calendar):
+    enqueue(conn, 3)
+    calendar.fail_after = 1
+    before = int(time.time())
+    assert calendar_sync.process_due(conn) == 1
+    (_, status, *_), *failed = jobs(conn)
+    assert status == "done"
+    for _, status, attempts, next_attempt_ts, last_error in failed:
+        assert (status, attempts) == ("pending", 1)
+        assert before + 30 <= next_attempt_ts <= int(time.time()) + 30
+        assert "unreachable" in last_error
+    assert calendar_sync.process_due(conn) == 0
+
+    calendar.fail_after = None
+    assert calendar_sync.process_due(conn, now=failed[0][3]) == 2
+    assert [(status, attempts) for _, status, attempts, *_ in jobs(conn)] == [("done", 1), ("done", 2), ("done", 2)]
+
+
+def test_discovery_failure_dead_letters_after_max_attempts(conn, monkeypatch):
+    def unreachable():
+        raise ConnectionError("CalDAV discovery failed")
+
+    monkeypatch.setattr(calendar_sync, "get_calendar", unreachable)
+    enqueue(conn, 1)
+    delays = []
+    for _ in range(calendar_sync.MAX_ATTEMPTS):
+        due = jobs(conn)[0][3]
+        before = int(time.time())
+        assert calendar_sync.process_due(conn, now=due) == 0
+        delays.append(jobs(conn)[0][3] - before)
+    _, status, attempts, next_attempt_ts, last_error = jobs(conn)[0]
+    assert (status, attempts) == ("failed", calendar_sync.MAX_ATTEMPTS)
+    assert "discovery failed" in last_error
+    # 30s doubling, capped at an hour
+    assert all(d <= delay <= d + 1 for d, delay in zip([30, 60, 120, 240, 480, 960, 1920, 3600], delays))
+    assert calendar_sync.process_due(conn, now=next_attempt_ts + 10 ** 6) == 0
+
+
+def test_failure_drops_the_cached_calendar(conn, monkeypatch):
+    monkeypatch.setattr(calendar_sync, "_calendar", FakeCalendar(fail_after=0))
+    enqueue(conn, 1)
+    assert calendar_sync.process_due(conn) == 0
+    # The next attempt rediscovers instead of reusing a dead session
+    assert calendar_sync._calendar is None
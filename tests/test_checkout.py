@@ -0,0 +1,160 @@
+import pytest
+import stripe
+
+import checkout
+
+
+class FakeSession:
+    def __init__(self, id, status="open", payment_status="unpaid"):
+        self.id, self.status, self.payment_status = id, status, payment_status
+        self.url = f"https://checkout.stripe.test/{id}"
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(checkout.time, "sleep", lambda seconds: None)
+
+
+@pytest.fixture
+def stripe_api(monkeypatch):
+    # Stands in for the Session endpoints; `fail` holds errors to raise before answering
+    api = {"creates": [], "retrieves": [], "sessions": {}, "fail": []}
+
+    def create(**params):
+        api["creates"].append(params)
+        if api["fail"]:
+            raise api["fail"].pop(0)
+        key = params["idempotency_key"]
+        # Same key, same parameters: Stripe replays the first response
+        session = api["sessions"].setdefault(key, FakeSession(f"cs_test_{len(api['sessions'])}"))
+        return session
+
+    def retrieve(session_id):
+        api["retrieves"].append(session_id)
+        if api["fail"]:
+            raise api["fail"].pop(0)
+        return next(s for s in api["sessions"].values() if s.id == session_id)
+
+    monkeypatch.setattr(stripe.checkout.Session, "create", staticmethod(create))
+    monkeypatch.setattr(stripe.checkout.Session, "retrieve", staticmethod(retrieve))
+    return api
+
+
+def start(conn, bid):
+    return checkout.session_for_booking(conn, bid, "Client", "client@example.com", "https://ok", "https://cancel")
+
+
+def deposit_paid(conn, bid):
+    return conn.execute("SELECT deposit_paid FROM bookings WHERE id = ?", (bid,)).fetchone()[0]
+
+
+def hold_expires_ts(conn, bid):
+    return conn.execute("SELECT hold_expires_ts FROM bookings WHERE id = ?", (bid,)).fetchone()[0]
+
+
+def test_create_is_keyed_by_booking_and_attached(conn, make_hold, stripe_api):
+    bid = make_hold()
+    session = start(conn, bid)
+    assert stripe_api["creates"][0]["idempotency_key"] == checkout.idempotency_key(bid)
+    assert stripe_api["creates"][0]["metadata"] == {"booking_id": bid}
+    stored = conn.execute("SELECT stripe_session_id FROM bookings WHERE id = ?", (bid,)).fetchone()[0]
+    assert stored == session.id
+
+
+def test_resubmit_reuses_open_session(conn, make_hold, stripe_api):
+    bid = make_hold()
+    first = start(conn, bid)
+    # A double-click reserves the same live hold again
+    assert make_hold() == bid
+    second = start(conn, bid)
+    assert second.id == first.id
+    assert len(stripe_api["creates"]) == 1
+    assert stripe_api["retrieves"] == [first.id]
+
+
+def test_replayed_create_has_identical_parameters(conn, make_hold, stripe_api):
+    # Create succeeded on Stripe but the response was lost before attach_session ran
+    bid = make_hold()
+    start(conn, bid)
+    conn.execute("UPDATE bookings SET stripe_session_id = NULL WHERE id = ?", (bid,))
+    conn.commit()
+    start(conn, bid)
+    first, replay = stripe_api["creates"]
+    assert first == replay
+    assert len(stripe_api["sessions"]) == 1
+
+
+def test_transient_errors_are_retried(conn, make_hold, stripe_api):
+    bid = make_hold()
+    stripe_api["fail"] = [stripe.error.APIConnectionError("reset"), stripe.error.RateLimitError("slow down")]
+    session = start(conn, bid)
+    assert len(stripe_api["creates"]) == 3
+    assert session.id == stripe_api["sessions"][checkout.idempotency_key(bid)].id
+
+
+def test_exhausted_retries_release_the_hold(conn, make_hold, stripe_api):
+    bid = make_hold()
+    stripe_api["fail"] = [stripe.error.APIError("down")] * checkout.MAX_ATTEMPTS
+    with pytest.raises(checkout.CheckoutUnavailable):
+        start(conn, bid)
+    assert len(stripe_api["creates"]) == checkout.MAX_ATTEMPTS
+    assert hold_expires_ts(conn, bid) == 0
+
+
+def test_idempotency_error_is_not_retried(conn, make_hold, stripe_api):
+    bid = make_hold()
+    stripe_api["fail"] = [stripe.error.IdempotencyError("key reused with different parameters")]
+    with pytest.raises(checkout.CheckoutUnavailable):
+        start(conn, bid)
+    assert len(stripe_api["creates"]) == 1
+
+
+def test_retrieve_failure_is_checkout_unavailable(conn, make_hold, stripe_api):
+    bid = make_hold()
+    start(conn, bid)
+    stripe_api["fail"] = [stripe.error.APIConnectionError("reset")] * checkout.MAX_ATTEMPTS
+    with pytest.raises(checkout.CheckoutUnavailable):
+        start(conn, bid)
+    assert hold_expires_ts(conn, bid) > 0
+
+
+def test_expired_session_releases_the_hold(conn, make_hold, stripe_api):
+    bid = make_hold()
+    start(conn, bid).status = "expired"
+    with pytest.raises(checkout.CheckoutUnavailable):
+        start(conn, bid)
+    assert hold_expires_ts(conn, bid) == 0
+
+
+def test_completed_session_confirms_instead_of_expiring(conn, make_hold, stripe_api):
+    # Paid, the webhook not applied yet, and the customer submits the same slot again
+    bid = make_hold()
+    session = start(conn, bid)
+    session.status, session.payment_status = "complete", "paid"
+    assert make_hold() == bid
+    with pytest.raises(checkout.AlreadyPaid):
+        start(conn, bid)
+    assert deposit_paid(conn, bid) == 1
+    assert conn.execute("SELECT COUNT(*) FROM calendar_jobs WHERE booking_id = ?", (bid,)).fetchone()[0] == 1
+
+
+def test_completed_session_awaiting_payment_is_not_booked(conn, make_hold, stripe_api):
+    # An async payment method: the session completed but the money hasn't cleared (or the payment failed)
+    bid = make_hold()
+    session = start(conn, bid)
+    session.status, session.payment_status = "complete", "unpaid"
+    with pytest.raises(checkout.PaymentProcessing):
+        start(conn, bid)
+    assert deposit_paid(conn, bid) == 0
+    assert hold_expires_ts(conn, bid) > 0
+    assert conn.execute("SELECT COUNT(*) FROM calendar_jobs WHERE booking_id = ?", (bid,)).fetchone()[0] == 0
+
+
+def test_success_page_check_requires_a_cleared_payment(conn, make_hold, stripe_api):
+    session = start(conn, make_hold())
+    session.status = "complete"
+    assert not checkout.is_paid(session.id)
+    session.payment_status = "paid"
+    assert checkout.is_paid(session.id)
+    stripe_api["fail"] = [stripe.error.AuthenticationError("bad key")]
+    assert not checkout.is_paid(session.id)
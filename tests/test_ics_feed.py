@@ -0,0 +1,67 @@
+import time
+
+import pytest
+
+import ics_feed
+import webhook_events
+
+
+@pytest.fixture(autouse=True)
+def fresh_feed(monkeypatch):
+    # The cache is per process; each test's database starts it over
+    monkeypatch.setattr(ics_feed, "_feed", dict(ics_feed._feed, day=None))
+
+
+@pytest.fixture
+def rows_queries(monkeypatch):
+    # The `since` of each _rows call: None is a full rebuild
+    calls = []
+    rows = ics_feed._rows
+
+    def recording(conn, horizon, since=None):
+        calls.append(since)
+        return rows(conn, horizon, since)
+
+    monkeypatch.setattr(ics_feed, "_rows", recording)
+    return calls
+
+
+def confirmed(conn, make_hold, day_offset=1):
+    bid = make_hold(day_offset=day_offset)
+    webhook_events.confirm_paid(conn, bid)
+    return bid
+
+
+def test_new_confirmation_is_added_without_a_rebuild(conn, make_hold, rows_queries):
+    first = confirmed(conn, make_hold)
+    body, etag, _ = ics_feed.feed(conn)
+    assert f"UID:{first}@cashin-ink" in body
+    assert ics_feed.feed(conn)[1] == etag
+    assert rows_queries == [None]
+
+    second = confirmed(conn, make_hold, day_offset=2)
+    body, new_etag, _ = ics_feed.feed(conn)
+    assert new_etag != etag
+    assert f"UID:{first}@cashin-ink" in body and f"UID:{second}@cashin-ink" in body
+    assert len(rows_queries) == 2 and rows_queries[1] is not None
+
+
+def test_late_commit_behind_the_newest_confirmation_is_picked_up(conn, make_hold):
+    newest = confirmed(conn, make_hold)
+    ics_feed.feed(conn)
+    # Stamped before `newest` but committed after the feed was built
+    late = confirmed(conn, make_hold, day_offset=2)
+    latest = conn.execute("SELECT confirmed_ts FROM bookings WHERE id = ?", (newest,)).fetchone()[0]
+    conn.execute("UPDATE bookings SET confirmed_ts = ? WHERE id = ?", (latest - 60, late))
+    conn.commit()
+    assert f"UID:{late}@cashin-ink" in ics_feed.feed(conn)[0]
+
+
+def test_rebuild_skips_appointments_past_the_horizon(conn, make_hold, rows_queries):
+    bid = confirmed(conn, make_hold)
+    later = time.time() + (ics_feed.FEED_HISTORY_DAYS + 5) * 86400
+    body, _, _ = ics_feed.feed(conn, now=later)
+    assert bid not in body
+    assert "BEGIN:VCALENDAR" in body
+    assert rows_queries == [None]
+
@@ -0,0 +1,142 @@
+import socket
+import time
+
+import pytest
+from aiosmtpd.controller import Controller
+
+import outbox
+
+
+class Sink:
+    # Accepts every message unless `fail` is set; smtplib greets once per connection
+    def __init__(self):
+        self.messages, self.connections, self.fail = [], 0, False
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        session.host_name = hostname
+        self.connections += 1
+        return responses
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.fail:
+            return "451 4.3.0 Mailbox temporarily unavailable"
+        self.messages.append(envelope)
+        return "250 OK"
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def sink():
+    sink = Sink()
+    controller = Controller(sink, hostname="127.0.0.1", port=free_port())
+    controller.start()
+    sink.port = controller.port
+    yield sink
+    controller.stop()
+
+
+@pytest.fixture
+def smtp(sink):
+    smtp = outbox.SMTPConnection("studio@example.com", "", "127.0.0.1", sink.port, starttls=False)
+    yield smtp
+    smtp.close()
+
+
+def unlimited():
+    return outbox.RateLimiter(per_minute=10 ** 6)
+
+
+def outbox_row(conn, mid):
+    return conn.execute(
+        "SELECT status, attempts, next_attempt_ts, last_error FROM outbox WHERE id = ?", (mid,)
+    ).fetchone()
+
+
+def only_id(conn):
+    return conn.execute("SELECT id FROM outbox").fetchone()[0]
+
+
+def test_batch_is_sent_over_one_connection(conn, sink, smtp):
+    for i in range(3):
+        outbox.enqueue(conn, f"client{i}@example.com", "Confirmed", f"Body {i}")
+    assert outbox.process_due(conn, smtp, unlimited()) == 3
+    assert [m.rcpt_tos for m in sink.messages] == [[f"client{i}@example.com"] for i in range(3)]
+    assert sink.connections == 1
+    statuses = conn.execute("SELECT status, attempts, last_error FROM outbox").fetchall()
+    assert statuses == [("sent", 1, None)] * 3
+    # Nothing left to claim
+    assert outbox.process_due(conn, smtp, unlimited()) == 0
+
+
+def test_failed_send_backs_off_then_retries(conn, sink, smtp):
+    outbox.enqueue(conn, "client@example.com", "Confirmed", "Body")
+    mid = only_id(conn)
+    sink.fail = True
+    before = int(time.time())
+    assert outbox.process_due(conn, smtp, unlimited()) == 0
+    status, attempts, next_attempt_ts, last_error = outbox_row(conn, mid)
+    assert (status, attempts) == ("pending", 1)
+    assert before + 30 <= next_attempt_ts <= int(time.time()) + 30
+    assert "Mailbox temporarily unavailable" in last_error
+    # Not due until the backoff runs out
+    assert outbox.process_due(conn, smtp, unlimited()) == 0
+
+    sink.fail = False
+    assert outbox.process_due(conn, smtp, unlimited(), now=next_attempt_ts) == 1
+    assert outbox_row(conn, mid)[:2] == ("sent", 2)
+    assert outbox_row(conn, mid)[3] is None
+    assert len(sink.messages) == 1
+
+
+def test_message_is_dead_lettered_after_max_attempts(conn, sink, smtp):
+    outbox.enqueue(conn, "client@example.com", "Confirmed", "Body")
+    mid = only_id(conn)
+    sink.fail = True
+    delays = []
+    for _ in range(outbox.MAX_ATTEMPTS):
+        due = outbox_row(conn, mid)[2]
+        before = int(time.time())
+        outbox.process_due(conn, smtp, unlimited(), now=due)
+        delays.append(outbox_row(conn, mid)[2] - before)
+    status, attempts, next_attempt_ts, _ = outbox_row(conn, mid)
+    assert (status, attempts) == ("failed", outbox.MAX_ATTEMPTS)
+    # 30s doubling, allowing a second of clock movement per attempt
+    assert all(d <= delay <= d + 1 for d, delay in zip([30, 60, 120, 240, 480, 960], delays))
+    assert outbox.process_due(conn, smtp, unlimited(), now=next_attempt_ts + 10 ** 6) == 0
+    assert sink.messages == []
+
+
+def test_rate_limiter_spaces_sends(monkeypatch):
+    clock = {"now": 1000.0}
+    slept = []
+
+    def sleep(seconds):
+        slept.append(seconds)
+        clock["now"] += seconds
+
+    monkeypatch.setattr(outbox.time, "monotonic", lambda: clock["now"])
+    monkeypatch.setattr(outbox.time, "sleep", sleep)
+    limiter = outbox.RateLimiter(per_minute=30)
+    for _ in range(4):
+        limiter.wait()
+    assert slept == [2.0, 2.0, 2.0]
+    # Idle time counts towards the next interval
+    clock["now"] += 10
+    limiter.wait()
+    assert slept == [2.0, 2.0, 2.0]
+
+
+def test_dropped_connection_is_reopened_once(conn, sink, smtp):
+    outbox.enqueue(conn, "first@example.com", "Confirmed", "Body")
+    assert outbox.process_due(conn, smtp, unlimited()) == 1
+    # The server hung up between batches; the next send reconnects instead of failing the message
+    smtp.server.sock.shutdown(socket.SHUT_RDWR)
+    outbox.enqueue(conn, "second@example.com", "Confirmed", "Body")
+    assert outbox.process_due(conn, smtp, unlimited()) == 1
+    assert len(sink.messages) == 2
+    assert sink.connections == 2
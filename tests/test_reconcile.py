@@ -0,0 +1,123 @@
+import pytest
+import stripe
+
+import reconcile
+import reservations
+import webhook_events
+
+
+class FakeSession:
+    def __init__(self, id, booking_id, payment_status="paid"):
+        self.id, self.status, self.payment_status = id, "complete", payment_status
+        self.metadata = {"booking_id": booking_id} if booking_id else {}
+
+
+class FakePage:
+    def __init__(self, sessions, limit, offset=0):
+        self.data = sessions[offset:offset + limit]
+        self.has_more = offset + limit < len(sessions)
+        self.next_page = lambda: FakePage(sessions, limit, offset + limit)
+
+
+@pytest.fixture
+def stripe_api(monkeypatch):
+    # Stands in for Session.list; tests append the account's completed sessions to `sessions`
+    api = {"sessions": [], "lists": []}
+
+    def list_sessions(**params):
+        api["lists"].append(params)
+        return FakePage(api["sessions"], params["limit"])
+
+    monkeypatch.setattr(stripe.checkout.Session, "list", staticmethod(list_sessions))
+    return api
+
+
+def paid_hold(conn, make_hold, stripe_api, day_offset=1, link=True):
+    bid = make_hold(day_offset=day_offset)
+    session = FakeSession(f"cs_{bid}", bid)
+    if link:
+        reservations.attach_session(conn, bid, session.id)
+    stripe_api["sessions"].append(session)
+    return bid
+
+
+def deposit_paid(conn, bid):
+    return conn.execute("SELECT deposit_paid FROM bookings WHERE id = ?", (bid,)).fetchone()[0]
+
+
+def queued(conn):
+    return (conn.execute("SELECT COUNT(*) FROM outbox").fetchone()[0],
+            conn.execute("SELECT COUNT(*) FROM calendar_jobs").fetchone()[0])
+
+
+def test_unrecorded_payment_is_confirmed_once(conn, make_hold, stripe_api):
+    bid = paid_hold(conn, make_hold, stripe_api)
+    unpaid = make_hold(day_offset=2)
+    stripe_api["sessions"].append(FakeSession(f"cs_{unpaid}", unpaid, payment_status="unpaid"))
+
+    stats = reconcile.reconcile(conn)
+    assert (stats["paid_sessions"], stats["confirmed"], stats["conflicts"], stats["missing"]) == (1, 1, [], [])
+    assert deposit_paid(conn, bid) == 1 and deposit_paid(conn, unpaid) == 0
+    assert queued(conn) == (1, 1)
+
+    # Re-running finds nothing new to do
+    again = reconcile.reconcile(conn)
+    assert (again["confirmed"], again["conflicts"], again["missing"]) == (0, [], [])
+    assert queued(conn) == (1, 1)
+
+
+def test_dry_run_changes_nothing(conn, make_hold, stripe_api):
+    bid = paid_hold(conn, make_hold, stripe_api)
+    stats = reconcile.reconcile(conn, dry_run=True)
+    assert stats["confirmed"] == 1
+    assert deposit_paid(conn, bid) == 0
+    assert queued(conn) == (0, 0)
+
+
+def test_paid_slot_taken_by_another_booking_is_a_conflict(conn, make_hold, stripe_api):
+    bid = paid_hold(conn, make_hold, stripe_api)
+    # A walk-in booked and paid for the same chair and time while this deposit went unrecorded
+    conn.execute(
+        "INSERT INTO bookings (id, artist_id, name, start_ts, end_ts, deposit_paid) "
+        "SELECT 'walk-in', artist_id, 'Walk-in', start_ts, end_ts, 1 FROM bookings WHERE id = ?", (bid,)
+    )
+    conn.commit()
+    stats = reconcile.reconcile(conn)
+    assert stats["confirmed"] == 0
+    assert stats["conflicts"] == [(bid, "walk-in")]
+    assert deposit_paid(conn, bid) == 0
+
+
+def test_confirmation_racing_the_webhook_is_not_a_conflict(conn, make_hold, stripe_api, monkeypatch):
+    bid = paid_hold(conn, make_hold, stripe_api)
+    match = reconcile.match
+
+    def webhook_lands_after_match(conn, paid):
+        matched = match(conn, paid)
+        webhook_events.confirm_paid(conn, bid)
+        return matched
+
+    monkeypatch.setattr(reconcile, "match", webhook_lands_after_match)
+    stats = reconcile.reconcile(conn)
+    assert (stats["confirmed"], stats["conflicts"], stats["missing"]) == (0, [], [])
+    assert deposit_paid(conn, bid) == 1
+    assert queued(conn) == (1, 1)
+
+
+def test_unlinked_session_is_matched_by_metadata(conn, make_hold, stripe_api):
+    # Checkout was created but the page died before the session id was stored on the row
+    bid = paid_hold(conn, make_hold, stripe_api, link=False)
+    stripe_api["sessions"].append(FakeSession("cs_orphan", "no-such-booking"))
+    stripe_api["sessions"].append(FakeSession("cs_foreign", None))
+    stats = reconcile.reconcile(conn)
+    assert stats["confirmed"] == 1
+    assert deposit_paid(conn, bid) == 1
+    assert sorted(stats["missing"]) == [("cs_foreign", None), ("cs_orphan", "no-such-booking")]
+
+
+def test_sessions_are_listed_a_page_at_a_time(stripe_api):
+    stripe_api["sessions"].extend(FakeSession(f"cs_{i}", f"b{i}", "paid" if i % 2 else "unpaid") for i in range(5))
+    paid, calls = reconcile.paid_sessions(0, page_size=2)
+    assert calls == 3
+    assert paid == {"cs_1": "b1", "cs_3": "b3"}
+    assert stripe_api["lists"] == [{"created": {"gte": 0}, "status": "complete", "limit": 2}]
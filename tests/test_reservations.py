@@ -0,0 +1,62 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import db
+import holds
+import reservations
+
+
+def overlapping_holds(conn, make_hold, count):
+    # Lapsed holds stop blocking new ones, so several unpaid rows can cover the same slot
+    bids = []
+    for i in range(count):
+        bids.append(make_hold(email=f"client{i}@example.com"))
+        holds.expire(conn, bids[-1])
+    return bids
+
+
+def test_overlapping_hold_is_refused(conn, make_hold):
+    make_hold(email="first@example.com")
+    with pytest.raises(reservations.SlotTaken):
+        make_hold(email="second@example.com")
+
+
+def test_resubmit_returns_the_live_hold(conn, make_hold):
+    assert make_hold() == make_hold()
+
+
+def test_artists_book_independently(conn, make_hold):
+    conn.execute("INSERT INTO artists (id, name, location_id) VALUES ('maya', 'Maya', 'covina')")
+    first = make_hold(email="first@example.com")
+    second = make_hold(email="second@example.com", artist_id="maya")
+    assert reservations.confirm(conn, first) and reservations.confirm(conn, second)
+
+
+def test_paid_booking_blocks_and_lapsed_hold_does_not(conn, make_hold):
+    bid = make_hold(email="first@example.com")
+    holds.expire(conn, bid)
+    other = make_hold(email="second@example.com")
+    assert reservations.confirm(conn, other)
+    assert not reservations.confirm(conn, bid)
+    with pytest.raises(reservations.SlotTaken):
+        make_hold(email="third@example.com")
+
+
+def test_concurrent_confirmations_have_one_winner(database, conn, make_hold):
+    bids = overlapping_holds(conn, make_hold, 8)
+    barrier = threading.Barrier(len(bids))
+
+    def confirm(bid):
+        own = db.connect(database)
+        barrier.wait()
+        try:
+            return reservations.confirm(own, bid)
+        finally:
+            own.close()
+
+    with ThreadPoolExecutor(len(bids)) as pool:
+        results = list(pool.map(confirm, bids))
+    assert sum(results) == 1
+    assert conn.execute("SELECT COUNT(*) FROM bookings WHERE deposit_paid = 1").fetchone()[0] == 1
@@ -0,0 +1,51 @@
+import os
+
+import pytest
+
+os.environ.setdefault("STRIPE_SECRET_KEY", "sk_test_tests")
+os.environ.setdefault("STRIPE_WEBHOOK_SECRET", "whsec_tests")
+import webhook
+import webhook_events
+
+
+@pytest.fixture
+def client(conn, monkeypatch):
+    monkeypatch.setattr(webhook.db, "get_conn", lambda: conn)
+    monkeypatch.setattr(webhook.ics_feed, "_feed", dict(webhook.ics_feed._feed, day=None))
+    return webhook.app.test_client()
+
+
+def test_ics_feed_is_off_without_a_token(client, monkeypatch):
+    monkeypatch.setattr(webhook, "ICS_FEED_TOKEN", None)
+    assert client.get("/calendar.ics").status_code == 404
+    assert client.get("/calendar.ics?token=").status_code == 404
+
+
+def test_ics_feed_requires_the_token(client, conn, make_hold, monkeypatch):
+    monkeypatch.setattr(webhook, "ICS_FEED_TOKEN", "s3cret")
+    webhook_events.confirm_paid(conn, make_hold())
+    assert client.get("/calendar.ics?token=guess").status_code == 404
+    response = client.get("/calendar.ics?token=s3cret")
+    assert response.status_code == 200
+    assert b"Client" in response.data
+
+
+def test_ics_feed_rejects_a_non_ascii_token(client, monkeypatch):
+    monkeypatch.setattr(webhook, "ICS_FEED_TOKEN", "s3cret")
+    assert client.get("/calendar.ics?token=s3cr%C3%A9t").status_code == 404
+
+
+def test_unchanged_feed_answers_304(client, conn, make_hold, monkeypatch):
+    monkeypatch.setattr(webhook, "ICS_FEED_TOKEN", "s3cret")
+    webhook_events.confirm_paid(conn, make_hold())
+    response = client.get("/calendar.ics?token=s3cret")
+    assert response.status_code == 200
+    etag, last_modified = response.headers["ETag"], response.headers["Last-Modified"]
+
+    assert client.get("/calendar.ics?token=s3cret", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get("/calendar.ics?token=s3cret", headers={"If-Modified-Since": last_modified}).status_code == 304
+
+    webhook_events.confirm_paid(conn, make_hold(day_offset=2))
+    response = client.get("/calendar.ics?token=s3cret", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
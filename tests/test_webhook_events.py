@@ -0,0 +1,90 @@
+import json
+
+import webhook_events
+
+
+def completed_event(event_id, bid):
+    return json.dumps({"id": event_id, "type": "checkout.session.completed",
+                       "data": {"object": {"id": f"cs_{event_id}", "metadata": {"booking_id": bid}}}})
+
+
+def queued(conn, table, bid=None):
+    if table == "outbox":
+        return conn.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+    return conn.execute("SELECT COUNT(*) FROM calendar_jobs WHERE booking_id = ?", (bid,)).fetchone()[0]
+
+
+def test_confirm_paid_queues_email_and_calendar_once(conn, make_hold):
+    bid = make_hold()
+    assert webhook_events.confirm_paid(conn, bid)
+    # The success page arriving second confirms nothing and queues nothing
+    assert not webhook_events.confirm_paid(conn, bid)
+    assert queued(conn, "calendar_jobs", bid) == 1
+    to_addr, subject, body = conn.execute("SELECT to_addr, subject, body FROM outbox").fetchone()
+    assert to_addr == "client@example.com"
+    assert "Confirmed" in subject and "Julio" in body
+    assert queued(conn, "outbox") == 1
+
+
+def test_dispatcher_confirmation_sends_the_email(conn, make_hold):
+    bid = make_hold()
+    assert webhook_events.record(conn, "evt_1", "checkout.session.completed", completed_event("evt_1", bid))
+    assert not webhook_events.record(conn, "evt_1", "checkout.session.completed", completed_event("evt_1", bid))
+    webhook_events.process_pending(conn)
+    assert conn.execute("SELECT deposit_paid FROM bookings WHERE id = ?", (bid,)).fetchone()[0] == 1
+    assert queued(conn, "outbox") == 1
+    assert queued(conn, "calendar_jobs", bid) == 1
+
+
+def event_row(conn, event_id):
+    return conn.execute(
+        "SELECT status, attempts, next_attempt_ts FROM stripe_events WHERE event_id = ?", (event_id,)
+    ).fetchone()
+
+
+def test_failing_events_back_off_without_blocking_newer_ones(conn, make_hold, monkeypatch):
+    apply = webhook_events.apply
+
+    def flaky(conn, event):
+        if event["id"].startswith("evt_bad"):
+            raise RuntimeError("handler bug")
+        apply(conn, event)
+
+    monkeypatch.setattr(webhook_events, "apply", flaky)
+    for i in range(3):
+        webhook_events.record(conn, f"evt_bad_{i}", "checkout.session.completed", completed_event(f"evt_bad_{i}", "x"))
+    bid = make_hold()
+    webhook_events.record(conn, "evt_good", "checkout.session.completed", completed_event("evt_good", bid))
+
+    # A batch no larger than the failing head of the queue still reaches the newer event on the next pass
+    assert webhook_events.process_pending(conn, batch_size=3) == 3
+    assert webhook_events.process_pending(conn, batch_size=3) == 1
+    assert event_row(conn, "evt_good")[0] == "done"
+    status, attempts, next_attempt_ts = event_row(conn, "evt_bad_0")
+    assert (status, attempts) == ("pending", 1)
+    assert webhook_events.process_pending(conn, batch_size=3) == 0
+    assert webhook_events.process_pending(conn, now=next_attempt_ts) == 3
+
+
+def test_event_is_dead_lettered_after_max_attempts(conn, monkeypatch):
+    monkeypatch.setattr(webhook_events, "apply", lambda conn, event: 1 / 0)
+    webhook_events.record(conn, "evt_bad", "checkout.session.completed", completed_event("evt_bad", "x"))
+    now = 0
+    for _ in range(webhook_events.MAX_ATTEMPTS):
+        now = event_row(conn, "evt_bad")[2]
+        assert webhook_events.process_pending(conn, now=now) == 1
+    status, attempts, _ = event_row(conn, "evt_bad")
+    assert (status, attempts) == ("failed", webhook_events.MAX_ATTEMPTS)
+    assert webhook_events.process_pending(conn, now=now + 10 ** 9) == 0
+    last_error = conn.execute("SELECT last_error FROM stripe_events WHERE event_id = 'evt_bad'").fetchone()[0]
+    assert "division by zero" in last_error
+
+
+def test_delayed_payment_confirms_when_it_succeeds(conn, make_hold):
+    bid = make_hold()
+    session = {"id": "cs_async", "payment_status": "unpaid", "metadata": {"booking_id": bid}}
+    webhook_events.apply(conn, {"type": "checkout.session.completed", "data": {"object": session}})
+    assert conn.execute("SELECT deposit_paid FROM bookings WHERE id = ?", (bid,)).fetchone()[0] == 0
+    session["payment_status"] = "paid"
+    webhook_events.apply(conn, {"type": "checkout.session.async_payment_succeeded", "data": {"object": session}})
+    assert conn.execute("SELECT deposit_paid FROM bookings WHERE id = ?", (bid,)).fetchone()[0] == 1
@@ -1,51 +1,31 @@
 # stripe_webhook.py — RUN THIS SEPARATELY FROM STREAMLIT APP
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 import stripe
-import sqlite3
+import hmac
 import os
-import pytz
-from datetime import datetime
-import caldav
+import calendar_sync
+import db
+import ics_feed
+import metrics
+import webhook_events
 
 app = Flask(__name__)
 
 # ==================== CONFIG ====================
 stripe.api_key = os.environ["STRIPE_SECRET_KEY"]
 STRIPE_WEBHOOK_SECRET = os.environ["STRIPE_WEBHOOK_SECRET"]
+# /calendar.ics requires ?token=<ICS_FEED_TOKEN> and is off (404) while it's unset; the feed carries
+# customer names and notes
+ICS_FEED_TOKEN = os.environ.get("ICS_FEED_TOKEN")
 
-DB_PATH = "bookings.db"  # Same DB as Streamlit (shared volume or copy)
-
-STUDIO_TZ = pytz.timezone("America/New_York")
-
-# iCloud CalDAV (use App-Specific Password!)
-cal_client = caldav.DAVClient(
-    url="https://caldav.icloud.com",
-    username=os.environ["ICLOUD_USER"],
-    password=os.environ["ICLOUD_PASS"]  # ← App-Specific Password
-)
-principal = cal_client.principal()
-calendar = principal.calendars()[0]
-
-conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-c = conn.cursor()
-
-def add_to_apple_calendar(name, desc, start_dt, end_dt):
-    event = f"""
-BEGIN:VCALENDAR
-VERSION:2.0
-BEGIN:VEVENT
-SUMMARY:Tattoo - {name}
-DESCRIPTION:{desc}
-DTSTART:{start_dt.astimezone(pytz.UTC).strftime('%Y%m%dT%H%M%SZ')}
-DTEND:{end_dt.astimezone(pytz.UTC).strftime('%Y%m%dT%H%M%SZ')}
-STATUS:CONFIRMED
-END:VEVENT
-END:VCALENDAR
-    """.strip()
-    calendar.add_event(event)
+# CalDAV writes go through calendar_sync's queue; the client connects lazily on first write
 
 @app.route("/webhook", methods=["POST"])
 def webhook():
+    with metrics.timed("webhook_request"):
+        return handle_webhook()
+
+def handle_webhook():
     payload = request.data
     sig_header = request.headers.get("Stripe-Signature")
 
@@ -57,32 +37,42 @@ def webhook():
         print("Webhook signature failed:", e)
         return jsonify(success=False), 400
 
-    if event["type"] == "checkout.session.completed":
-        session = event["data"]["object"]
-        booking_id = session.get("metadata", {}).get("booking_id")
-
-        if not booking_id:
-            return jsonify(success=True), 200
-
-        row = c.execute(
-            "SELECT name, description, start_dt, end_dt FROM bookings WHERE id=?",
-            (booking_id,)
-        ).fetchone()
-
-        if row and not c.execute("SELECT deposit_paid FROM bookings WHERE id=?", (booking_id,)).fetchone()[0]:
-            name, desc, start_iso, end_iso = row
-            c.execute("UPDATE bookings SET deposit_paid=1 WHERE id=?", (booking_id,))
-            conn.commit()
-
-            try:
-                start_dt = datetime.fromisoformat(start_iso).astimezone(STUDIO_TZ)
-                end_dt = datetime.fromisoformat(end_iso).astimezone(STUDIO_TZ)
-                add_to_apple_calendar(name, desc, start_dt, end_dt)
-                print(f"Added to calendar: {name} on {start_dt.strftime('%b %d %I:%M %p')}")
-            except Exception as e:
-                print("Calendar sync failed:", e)
+    # Verify, store, ack. webhook_events' dispatcher applies the event off the request path.
+    if not webhook_events.record(db.get_conn(), event["id"], event["type"], payload.decode("utf-8")):
+        return jsonify(success=True, duplicate=True), 200
 
     return jsonify(success=True), 200
 
+# Subscription feed of confirmed appointments. Calendar clients poll it; unchanged bookings answer 304.
+@app.route("/calendar.ics", methods=["GET"])
+def calendar_feed():
+    token = request.args.get("token", "")
+    if not ICS_FEED_TOKEN or not hmac.compare_digest(token.encode(), ICS_FEED_TOKEN.encode()):
+        return "Not found", 404
+    with metrics.timed("ics_feed"):
+        body, etag, last_modified = ics_feed.feed(db.get_conn())
+        response = Response(body, mimetype="text/calendar")
+        response.set_etag(etag)
+        if last_modified:
+            response.last_modified = last_modified
+        response.cache_control.private = True
+        response.cache_control.max_age = 60
+        return response.make_conditional(request)
+
+# Prometheus scrape target; covers every process that writes to the same database
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    conn = db.get_conn()
+    metrics.flush(conn)
+    return Response(metrics.render(conn), mimetype="text/plain; version=0.0.4")
+
+def start_background_workers():
+    webhook_events.start_dispatcher()
+    calendar_sync.start_worker()
+    metrics.start_flusher()
+
+# Development server. In production run gunicorn, which starts the workers per process:
+#   gunicorn -c gunicorn.conf.py webhook:app
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=int(os.environ.get("PORT", 5000)))
\ No newline at end of file
+    start_background_workers()
+    app.run(host="0.0.0.0", port=int(os.environ.get("PORT", 5000)), threaded=True)
\ No newline at end of file
@@ -0,0 +1,126 @@
+# webhook_events.py — verified Stripe events are stored first and applied by a background dispatcher
+import json
+import threading
+import time
+from datetime import datetime
+import blobstore
+import calendar_sync
+import db
+import holds
+import images
+import metrics
+import outbox
+import reservations
+import schedules
+
+BATCH_SIZE = 100
+MAX_ATTEMPTS = 8
+LEASE_SECONDS = 300
+
+_wakeup = threading.Event()
+
+
+def record(conn, event_id, event_type, payload):
+    # Returns False for a delivery whose event id is already in the ledger
+    now = int(time.time())
+    with db.transaction(conn):
+        recorded = conn.execute(
+            "INSERT INTO stripe_events (event_id, type, received_at, received_ts, payload, status, attempts, "
+            "next_attempt_ts) VALUES (?, ?, ?, ?, ?, 'pending', 0, ?) ON CONFLICT (event_id) DO NOTHING",
+            (event_id, event_type, datetime.utcnow().isoformat(), now, payload, now)
+        ).rowcount
+    if recorded:
+        _wakeup.set()
+    return bool(recorded)
+
+
+def confirmation_body(name, appt_date, appt_time, schedule):
+    return f"""
+Thank you {name}!
+
+Your tattoo appointment has been successfully booked and your $150 deposit is confirmed.
+
+📅 Date: {appt_date}
+🕒 Time: {appt_time}
+
+{schedule.artist_name} will reach out within 24 hours to discuss your design and finalize details.
+
+We can't wait to create something amazing with you!
+
+— Cashin Ink Team
+{schedule.location_name}
+    """
+
+
+def confirm_paid(conn, booking_id, upload_dir=blobstore.UPLOAD_DIR):
+    # rowcount of the single conditional UPDATE decides whether side effects run. Every path that confirms
+    # (this dispatcher, the success page, checkout's session reuse, reconcile.py) comes through here, and the
+    # calendar write and confirmation email are queued in the same transaction as the confirmation.
+    with db.transaction(conn):
+        if not reservations.confirm(conn, booking_id):
+            return False
+        name, email, desc, appt_date, appt_time, start_ts, end_ts, artist_id = conn.execute(
+            "SELECT name, email, description, date, time, start_ts, end_ts, artist_id FROM bookings WHERE id = ?",
+            (booking_id,)
+        ).fetchone()
+        calendar_sync.enqueue(conn, booking_id, name, desc, start_ts, end_ts)
+        if email:
+            outbox.enqueue(
+                conn, email, "Cashin Ink — Your Appointment is Confirmed!",
+                confirmation_body(name, appt_date, appt_time, schedules.get(conn, artist_id)),
+                [images.email_attachment(path, filename)
+                 for path, filename in blobstore.files_for_booking(conn, upload_dir, booking_id)]
+            )
+    return True
+
+
+def apply(conn, event):
+    obj = event["data"]["object"]
+    booking_id = (obj.get("metadata") or {}).get("booking_id")
+
+    # A completed session with a delayed payment method is confirmed when its payment succeeds
+    paid = event["type"] == "checkout.session.async_payment_succeeded" or (
+        event["type"] == "checkout.session.completed" and obj.get("payment_status", "paid") == "paid")
+    if paid and booking_id:
+        confirm_paid(conn, booking_id)
+
+    elif event["type"] == "checkout.session.expired" and booking_id:
+        holds.expire(conn, booking_id)
+
+
+def process_pending(conn, batch_size=BATCH_SIZE, now=None):
+    # Events backing off after a failure aren't due, so they can't hold up newer ones
+    pending = db.claim_due(conn, "stripe_events", ("payload",), batch_size, LEASE_SECONDS, key="event_id", now=now)
+    for event_id, payload, attempts in pending:
+        try:
+            # Completion and side effects commit together; a row another dispatcher finished matches 0 rows
+            with db.transaction(conn):
+                claimed = conn.execute(
+                    "UPDATE stripe_events SET status = 'done', processed_at = ?, last_error = NULL "
+                    "WHERE event_id = ? AND status = 'pending'",
+                    (datetime.utcnow().isoformat(), event_id)
+                ).rowcount
+                if claimed:
+                    event = json.loads(payload)
+                    with metrics.timed("webhook_event", event_type=event["type"], event_id=event_id):
+                        apply(conn, event)
+        except Exception as e:
+            db.retry_later(conn, "stripe_events", [(event_id, attempts, e)], MAX_ATTEMPTS, key="event_id")
+            print(f"Stripe event {event_id} failed (attempt {attempts}):", e)
+    return len(pending)
+
+
+def start_dispatcher(interval=2, path=db.DB_PATH):
+    def run():
+        while True:
+            try:
+                if process_pending(db.get_conn(path)) < BATCH_SIZE:
+                    _wakeup.wait(interval)
+                    _wakeup.clear()
+            except Exception as e:
+                print("Stripe event dispatcher failed:", e)
+                time.sleep(interval)
+
+    thread = threading.Thread(target=run, name="stripe-events", daemon=True)
+    thread.start()
+    return thread